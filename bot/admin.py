@@ -6,11 +6,13 @@ from .models import (
     Location,
     Position,
     JobApplication,
-    PageContent
+    PageContent,
+    OutboxMessage,
+    Broadcast,
 )
-import openpyxl
-from django.http import HttpResponse
-from django.utils.timezone import localtime
+from conf.paginator import EstimatedCountPaginator
+from reports.actions import background_export
+from .exports import applications_csv, applications_xlsx
 
 
 # -----------------------
@@ -67,63 +69,49 @@ class PositionAdmin(admin.ModelAdmin):
 
 @admin.register(JobApplication)
 class JobApplicationAdmin(admin.ModelAdmin):
-    # Show all fields dynamically, including new comments field
-    list_display = [
-        field.name
-        for field in JobApplication._meta.get_fields()
-        if not field.many_to_many and not field.one_to_many
-    ]
+    # comments can be long, it is only shown on the change form
+    list_display = (
+        "id",
+        "user",
+        "full_name",
+        "birth_date",
+        "region",
+        "district",
+        "position",
+        "previous_job",
+        "location",
+        "phone_number",
+        "created_at",
+        "status",
+    )
+    list_select_related = ("user", "position", "location")
+    autocomplete_fields = ("user", "position", "location")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     search_fields = ("user__first_name", "user__last_name", "phone_number", "comments")
     list_filter = ("status", "position", "location", "region")
 
-    actions = ["export_to_excel"]
+    actions = [
+        "export_to_excel",
+        "export_to_csv",
+        background_export("applications_xlsx"),
+        background_export("applications_csv"),
+    ]
 
     def export_to_excel(self, request, queryset):
-        # Create workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Job Applications"
-
-        # Get all non-many fields
-        fields = [
-            field
-            for field in JobApplication._meta.get_fields()
-            if not field.many_to_many and not field.one_to_many
-        ]
-
-        # Header row
-        headers = [field.name for field in fields]
-        ws.append(headers)
-
-        # Data rows
-        for app in queryset:
-            row = []
-            for field in fields:
-                value = getattr(app, field.name)
-
-                # Convert related objects to string
-                if hasattr(value, "all"):
-                    value = ", ".join([str(i) for i in value.all()])
-                elif hasattr(value, "__str__") and field.is_relation:
-                    value = str(value) if value else ""
-
-                # Convert timezone-aware datetimes to naive
-                if hasattr(value, "tzinfo") and value.tzinfo is not None:
-                    value = localtime(value).replace(tzinfo=None)
-
-                row.append(value)
-            ws.append(row)
-
-        # Prepare HTTP response
-        response = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        response["Content-Disposition"] = "attachment; filename=job_applications.xlsx"
-        wb.save(response)
-        return response
+        return applications_xlsx(queryset)
 
     export_to_excel.short_description = "Export selected Job Applications to Excel"
+
+    def export_to_csv(self, request, queryset):
+        return applications_csv(queryset)
+
+    export_to_csv.short_description = "Export selected Job Applications to CSV"
+
+    def get_queryset(self, request):
+        # comments is loaded on its own when the change form needs it
+        return super().get_queryset(request).defer("comments")
 # -----------------------
 # PageContent
 # -----------------------
@@ -131,3 +119,35 @@ class JobApplicationAdmin(admin.ModelAdmin):
 class PageContentAdmin(admin.ModelAdmin):
     list_display = ("id", "key")
     search_fields = ("key", "text")
+    readonly_fields = ("telegram_file_id", "image_hash")
+
+
+# -----------------------
+# OutboxMessage
+# -----------------------
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ("id", "method", "chat_id", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status", "method")
+    search_fields = ("chat_id",)
+    readonly_fields = ("created_at", "sent_at", "claimed_at")
+
+
+# -----------------------
+# Broadcast
+# -----------------------
+@admin.register(Broadcast)
+class BroadcastAdmin(admin.ModelAdmin):
+    list_display = ("id", "text", "status", "sent", "failed", "blocked", "created_at", "finished_at")
+    list_filter = ("status",)
+    readonly_fields = (
+        "status", "last_user_id", "sent", "failed", "blocked", "retry_user_ids", "started_at", "finished_at",
+    )
+    autocomplete_fields = ("position", "location")
+
+    actions = ["pause_broadcast"]
+
+    def pause_broadcast(self, request, queryset):
+        queryset.filter(status=Broadcast.RUNNING).update(status=Broadcast.PAUSED)
+
+    pause_broadcast.short_description = "Pause selected broadcasts"
@@ -1,6 +1,18 @@
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class BotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bot'
+
+    def ready(self):
+        from . import signals
+        signals.connect()
+
+        if settings.BOT_WEBHOOK_ON_STARTUP:
+            # In the background so startup never waits on a Telegram round trip
+            from .webhook import ensure_webhook_quietly
+            threading.Thread(target=ensure_webhook_quietly, daemon=True).start()
@@ -0,0 +1,133 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from . import profiles
+from .models import Broadcast, JobApplication, TgUser
+from .outbound import CircuitOpen, TelegramError, get_client
+
+logger = logging.getLogger(__name__)
+
+
+def audience(broadcast):
+    """Active TgUsers matching the broadcast's filters, as (pk, telegram_id) rows."""
+    qs = TgUser.objects.filter(deleted=False)
+    if broadcast.language_code:
+        qs = qs.filter(language_code=broadcast.language_code)
+    if broadcast.position_id or broadcast.location_id:
+        applications = JobApplication.objects.filter(user=OuterRef("pk"))
+        if broadcast.position_id:
+            applications = applications.filter(position_id=broadcast.position_id)
+        if broadcast.location_id:
+            applications = applications.filter(location_id=broadcast.location_id)
+        qs = qs.filter(Exists(applications))
+    return qs.values_list("pk", "telegram_id")
+
+
+def iter_batches(qs, after_pk=0, batch_size=500):
+    """Keyset pagination over (pk, ...) rows; only one batch is in memory at a time."""
+    while True:
+        batch = list(qs.filter(pk__gt=after_pk).order_by("pk")[:batch_size])
+        if not batch:
+            return
+        yield batch
+        after_pk = batch[-1][0]
+
+
+class BroadcastRunner:
+    """
+    Sends a Broadcast with bounded concurrency. The shared TelegramClient's
+    rate limiter keeps the overall pace at Telegram's limit; progress is
+    checkpointed after every batch so an interrupted run resumes where it left.
+
+    Recipients hit by a transient error (5xx, network, open circuit) are
+    kept in Broadcast.retry_user_ids and tried again once the audience has
+    been walked. A batch in which nobody could be reached means Telegram is
+    down: the broadcast is paused and resumes with send_broadcast.
+    """
+
+    def __init__(self, broadcast, client=None, concurrency=8, batch_size=500, retry_rounds=3):
+        self.broadcast = broadcast
+        self.client = client or get_client()
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.retry_rounds = retry_rounds
+
+    def _send(self, telegram_id):
+        payload = {"chat_id": telegram_id, "text": self.broadcast.text, "parse_mode": "HTML"}
+        for _ in range(5):
+            try:
+                self.client.call("sendMessage", payload)
+                return "sent"
+            except CircuitOpen:
+                return "retry"
+            except TelegramError as e:
+                if e.error_code == 403:
+                    return "blocked"
+                if e.is_permanent:
+                    logger.warning("Broadcast %s to %s failed: %s", self.broadcast.pk, telegram_id, e)
+                    return "failed"
+                if e.retry_after is None:
+                    return "retry"
+                # 429: wait it out instead of burning the audience
+                time.sleep(max(e.retry_after, 1))
+        return "retry"
+
+    def _send_batch(self, pool, rows, retry, **progress):
+        """Send to (pk, telegram_id) rows; False when none of them could be reached."""
+        telegram_ids = [telegram_id for _, telegram_id in rows]
+        results = list(pool.map(self._send, telegram_ids))
+        blocked = [tid for tid, r in zip(telegram_ids, results) if r == "blocked"]
+        profiles.mark_deleted_many(blocked)
+        retry.extend(pk for (pk, _), r in zip(rows, results) if r == "retry")
+
+        Broadcast.objects.filter(pk=self.broadcast.pk).update(
+            retry_user_ids=sorted(retry),
+            sent=F("sent") + results.count("sent"),
+            failed=F("failed") + results.count("failed"),
+            blocked=F("blocked") + len(blocked),
+            **progress,
+        )
+        return results.count("retry") < len(results)
+
+    def _pause(self, reason):
+        logger.warning("Broadcast %s paused: %s", self.broadcast.pk, reason)
+        Broadcast.objects.filter(pk=self.broadcast.pk).update(status=Broadcast.PAUSED)
+        return False
+
+    def run(self):
+        b = self.broadcast
+        Broadcast.objects.filter(pk=b.pk).update(
+            status=Broadcast.RUNNING, started_at=b.started_at or timezone.now()
+        )
+        retry = list(Broadcast.objects.filter(pk=b.pk).values_list("retry_user_ids", flat=True).get())
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for batch in iter_batches(audience(b), b.last_user_id, self.batch_size):
+                # Let an admin pause a running broadcast between batches
+                if Broadcast.objects.filter(pk=b.pk, status=Broadcast.PAUSED).exists():
+                    return False
+                if not self._send_batch(pool, batch, retry, last_user_id=batch[-1][0]):
+                    return self._pause("Telegram unreachable")
+
+            for _ in range(self.retry_rounds):
+                if not retry:
+                    break
+                pending, retry[:] = sorted(retry), []
+                chunks = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+                for n, chunk in enumerate(chunks):
+                    # Users who left the audience meanwhile (blocked, deleted) drop out
+                    rows = list(audience(b).filter(pk__in=chunk).order_by("pk"))
+                    if rows and not self._send_batch(pool, rows, retry):
+                        # Chunks not tried yet stay queued for the next resume
+                        retry.extend(pk for rest in chunks[n + 1:] for pk in rest)
+                        Broadcast.objects.filter(pk=b.pk).update(retry_user_ids=sorted(retry))
+                        return self._pause("Telegram unreachable")
+            if retry:
+                return self._pause(f"{len(retry)} recipients still failing")
+
+        Broadcast.objects.filter(pk=b.pk).update(status=Broadcast.DONE, finished_at=timezone.now())
+        return True
@@ -0,0 +1,127 @@
+import threading
+import time
+
+from django.conf import settings
+from telebot import types
+
+from .models import JobCategory, Location, Menu, Position
+
+
+def _two_per_row(kb, buttons):
+    for i in range(0, len(buttons), 2):
+        kb.row(*buttons[i:i + 2])
+    return kb
+
+
+class Catalog:
+    """
+    Prebuilt, JSON-serialized keyboards plus the menu title -> key dispatch dict.
+
+    Rebuilt lazily after a post_save/post_delete signal on Menu, JobCategory,
+    Location or Position. Signals only reach the process that made the change,
+    so BOT_CATALOG_TTL bounds how long other workers may serve an old copy.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self, **kwargs):
+        with self._lock:
+            self._snapshot = None
+
+    @property
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None or self._expired():
+            with self._lock:
+                # Threads that queued on the lock reuse the build they waited for
+                snapshot = self._snapshot
+                if snapshot is None or self._expired():
+                    snapshot = self._build()
+                    self._snapshot = snapshot
+                    self._built_at = time.monotonic()
+        return snapshot
+
+    def _expired(self):
+        return time.monotonic() - self._built_at > settings.BOT_CATALOG_TTL
+
+    def _build(self):
+        menus = list(Menu.objects.all())
+        categories = list(JobCategory.objects.all())
+        locations = list(Location.objects.all())
+        positions = list(Position.objects.all())
+
+        main_menu = _two_per_row(
+            types.ReplyKeyboardMarkup(resize_keyboard=True),
+            [types.KeyboardButton(menu.title) for menu in menus],
+        )
+        category_kb = _two_per_row(
+            types.InlineKeyboardMarkup(),
+            [
+                types.InlineKeyboardButton(f"{cat.icon or ''} {cat.name}", callback_data=f"cat_{cat.id}")
+                for cat in categories
+            ],
+        )
+
+        back_only = types.InlineKeyboardMarkup()
+        back_only.row(types.InlineKeyboardButton("⬅️ Ortga", callback_data="back_cat"))
+        location_kbs = {None: back_only.to_json()}
+        for cat in categories:
+            kb = _two_per_row(
+                types.InlineKeyboardMarkup(),
+                [
+                    types.InlineKeyboardButton(loc.name, callback_data=f"loc_{loc.id}")
+                    for loc in locations if loc.category_id == cat.id
+                ],
+            )
+            kb.row(types.InlineKeyboardButton("⬅️ Ortga", callback_data="back_cat"))
+            location_kbs[cat.id] = kb.to_json()
+
+        position_kbs = {None: types.InlineKeyboardMarkup().to_json()}
+        for cat in categories:
+            position_kbs[cat.id] = _two_per_row(
+                types.InlineKeyboardMarkup(),
+                [
+                    types.InlineKeyboardButton(pos.title, callback_data=f"pos_{pos.id}")
+                    for pos in positions if pos.category_id == cat.id
+                ],
+            ).to_json()
+
+        return {
+            "main_menu": main_menu.to_json(),
+            "menu_keys": {menu.title: menu.key for menu in menus},
+            "categories": category_kb.to_json(),
+            "locations": location_kbs,
+            "location_info": {
+                loc.id: (loc.category_id, loc.latitude, loc.longitude) for loc in locations
+            },
+            "positions": position_kbs,
+        }
+
+    @property
+    def main_menu(self):
+        return self.snapshot["main_menu"]
+
+    @property
+    def categories(self):
+        return self.snapshot["categories"]
+
+    def menu_key(self, title):
+        return self.snapshot["menu_keys"].get(title)
+
+    def locations(self, category_id):
+        kbs = self.snapshot["locations"]
+        return kbs.get(category_id, kbs[None])
+
+    def location_info(self, location_id):
+        """(category_id, latitude, longitude) or None."""
+        return self.snapshot["location_info"].get(location_id)
+
+    def positions(self, category_id):
+        kbs = self.snapshot["positions"]
+        return kbs.get(category_id, kbs[None])
+
+
+catalog = Catalog()
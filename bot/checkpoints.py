@@ -0,0 +1,30 @@
+from django.db import IntegrityError, transaction
+
+from .models import BotCheckpoint
+
+
+def get(name, default=0):
+    value = BotCheckpoint.objects.filter(name=name).values_list("value", flat=True).first()
+    return default if value is None else value
+
+
+def read(name):
+    """(value, updated_at) of a checkpoint; (0, None) when it was never set."""
+    return BotCheckpoint.objects.filter(name=name).values_list("value", "updated_at").first() or (0, None)
+
+
+def advance(name, value):
+    """Raise the checkpoint to value; never moves it backwards."""
+    if BotCheckpoint.objects.filter(name=name, value__lt=value).update(value=value):
+        return
+    try:
+        with transaction.atomic():
+            BotCheckpoint.objects.create(name=name, value=value)
+    except IntegrityError:
+        # Created concurrently, or already at/above value
+        BotCheckpoint.objects.filter(name=name, value__lt=value).update(value=value)
+
+
+def reset(name, value):
+    """Set the checkpoint to value even if that is lower, e.g. after Telegram restarted its numbering."""
+    BotCheckpoint.objects.update_or_create(name=name, defaults={"value": value})
@@ -0,0 +1,188 @@
+import logging
+import re
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from . import checkpoints
+
+logger = logging.getLogger(__name__)
+
+UPDATE_ID_RE = re.compile(rb'"update_id"\s*:\s*(\d+)')
+
+CHECKPOINT = "webhook_update_id"
+
+
+def extract_update_id(body):
+    """update_id from a raw webhook body without parsing the JSON; None if absent."""
+    match = UPDATE_ID_RE.search(body[:256])
+    return int(match.group(1)) if match else None
+
+
+class UpdateDeduplicator:
+    """
+    Remembers the last `window` update_ids this process accepted.
+
+    Telegram redelivers an update when we answer slowly or with an error, so
+    an id seen again is answered without running the handlers. Ids older
+    than the window, or at or below the high-water mark shared by all
+    processes, are treated as seen too: Telegram hands out update_ids in
+    increasing order and only redelivers ones it already sent. Up to
+    `in_flight` ids below the mark may still be on their first delivery to
+    another worker process, so those are not dropped.
+
+    claim() never touches the database. flush() re-reads the shared mark and
+    writes this process's; with `flush_interval` set a background thread
+    runs it that often, so a redelivery to another worker is caught once
+    the mark has gone round.
+
+    After a week without updates Telegram starts again from a random
+    update_id. An id more than `reset_distance` below the mark, or one
+    arriving when the mark has not moved for `reset_after` seconds (Telegram
+    drops undelivered updates after 24 hours, so it cannot be a
+    redelivery), is taken as such a restart and lowers the mark.
+    """
+
+    def __init__(self, window=10000, in_flight=40, flush_interval=None,
+                 reset_distance=100000, reset_after=24 * 60 * 60):
+        self.window = window
+        self.in_flight = in_flight
+        self.flush_interval = flush_interval
+        self.reset_distance = reset_distance
+        self.reset_after = timedelta(seconds=reset_after)
+        self._seen = set()
+        self._order = deque()
+        self._evicted = 0  # highest id pushed out of the window
+        self._mark = None  # shared high-water mark as last read
+        self._mark_at = None  # when it last moved
+        self._max_seen = 0
+        self._persisted = 0
+        self._reset = None  # restart seen here, not yet written
+        self._thread = None
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.duplicates = 0
+        self.resets = 0
+
+    def _floor(self):
+        if self._mark is None:
+            return self._evicted
+        return max(self._evicted, self._mark - self.in_flight)
+
+    def _forget(self):
+        self._seen.clear()
+        self._order.clear()
+        self._evicted = self._max_seen = self._persisted = 0
+
+    def _refresh(self):
+        value, updated_at = checkpoints.read(CHECKPOINT)
+        with self._lock:
+            if self._mark is not None and value < self._mark:
+                # Another process saw the numbering restart
+                self._forget()
+            self._mark, self._mark_at = value, updated_at
+            self._max_seen = max(self._max_seen, value)
+            self._persisted = max(self._persisted, value)
+
+    def _is_restart(self, update_id):
+        if self._mark is None:
+            return False
+        if self._mark - update_id > self.reset_distance:
+            return True
+        return self._mark_at is not None and timezone.now() - self._mark_at > self.reset_after
+
+    def flush(self):
+        """Re-read the shared mark and raise it to the highest id seen here."""
+        with self._lock:
+            reset, self._reset = self._reset, None
+        if reset is not None:
+            try:
+                checkpoints.reset(CHECKPOINT, reset)
+            except Exception:
+                with self._lock:
+                    self._reset = self._reset or reset
+                raise
+        # Read before writing, so a restart another process recorded is
+        # followed rather than overwritten with ids from before it
+        self._refresh()
+        with self._lock:
+            value = self._max_seen if self._max_seen > self._persisted else None
+        if value is not None:
+            checkpoints.advance(CHECKPOINT, value)
+            with self._lock:
+                self._persisted = max(self._persisted, value)
+
+    def _start(self):
+        if self.flush_interval is None or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="bot-dedup-flush", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Dedup checkpoint flush failed")
+            finally:
+                close_old_connections()
+            time.sleep(self.flush_interval)
+
+    def claim(self, update_id):
+        """Record update_id; False when it was already handled."""
+        self._start()
+        with self._lock:
+            if update_id in self._seen:
+                self.duplicates += 1
+                return False
+            if update_id <= self._floor():
+                if not self._is_restart(update_id):
+                    self.duplicates += 1
+                    return False
+                self._forget()
+                self._mark, self._mark_at = update_id, timezone.now()
+                self._max_seen = self._persisted = update_id
+                self._reset = update_id
+                self.resets += 1
+
+            self._seen.add(update_id)
+            self._order.append(update_id)
+            while len(self._order) > self.window:
+                oldest = self._order.popleft()
+                self._seen.discard(oldest)
+                self._evicted = max(self._evicted, oldest)
+            self._max_seen = max(self._max_seen, update_id)
+            self.accepted += 1
+        return True
+
+    def release(self, update_id):
+        """Forget a claimed id whose update was not accepted (e.g. the queue was full)."""
+        with self._lock:
+            if update_id in self._seen:
+                self._seen.discard(update_id)
+                self._order.remove(update_id)
+                self.accepted -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "accepted": self.accepted,
+                "duplicates": self.duplicates,
+                "tracked": len(self._order),
+                "high_water_mark": self._max_seen,
+                "resets": self.resets,
+            }
+
+
+deduplicator = UpdateDeduplicator(
+    window=settings.BOT_DEDUP_WINDOW,
+    in_flight=settings.BOT_WEBHOOK_MAX_CONNECTIONS or 40,
+    flush_interval=settings.BOT_DEDUP_FLUSH_INTERVAL,
+)
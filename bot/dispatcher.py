@@ -0,0 +1,115 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateDispatcher:
+    """
+    Bounded in-process queue drained by a pool of worker threads.
+
+    Each chat is pinned to one worker (chat_id % workers), so updates of the
+    same chat are handled in arrival order while different chats run in
+    parallel.
+    """
+
+    def __init__(self, handler, workers=4, maxsize=1000, name="bot-update"):
+        self.handler = handler
+        self.workers = max(1, workers)
+        per_worker = max(1, maxsize // self.workers)
+        self._queues = [queue.Queue(maxsize=per_worker) for _ in range(self.workers)]
+        self._threads = []
+        self._name = name
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i, q in enumerate(self._queues):
+                t = threading.Thread(
+                    target=self._run, args=(q,), name=f"{self._name}-{i}", daemon=True
+                )
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, chat_id, item):
+        """Queue an item; returns False when the worker's queue is full."""
+        q = self._queues[(chat_id or 0) % self.workers]
+        try:
+            q.put_nowait((time.monotonic(), item))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+        return True
+
+    def _run(self, q):
+        while True:
+            queued_at, item = q.get()
+            try:
+                self.handler(item)
+            except Exception:
+                logger.exception("Update processing failed")
+                with self._lock:
+                    self.failed += 1
+            finally:
+                close_old_connections()
+                with self._lock:
+                    self.processed += 1
+                    self._latencies.append(time.monotonic() - queued_at)
+                q.task_done()
+
+    def join(self):
+        for q in self._queues:
+            q.join()
+
+    @property
+    def depth(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            processed, failed, rejected = self.processed, self.failed, self.rejected
+
+        def pct(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2)
+
+        return {
+            "workers": self.workers,
+            "depth": self.depth,
+            "processed": processed,
+            "failed": failed,
+            "rejected": rejected,
+            "latency_ms": {"p50": pct(0.5), "p95": pct(0.95), "max": pct(1.0)},
+        }
+
+
+def update_chat_id(update):
+    """Chat used to order an update; falls back to the sender id."""
+    if update.get("message"):
+        return update["message"]["chat"]["id"]
+    for key in ("edited_message", "channel_post", "edited_channel_post", "my_chat_member", "chat_member"):
+        if update.get(key):
+            return update[key]["chat"]["id"]
+    if update.get("callback_query"):
+        cq = update["callback_query"]
+        if cq.get("message"):
+            return cq["message"]["chat"]["id"]
+        return cq["from"]["id"]
+    for value in update.values():
+        if isinstance(value, dict) and isinstance(value.get("from"), dict):
+            return value["from"]["id"]
+    return 0
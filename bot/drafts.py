@@ -0,0 +1,11 @@
+from django.core.exceptions import ValidationError
+
+from .models import JobApplication
+
+
+def clean_field(name, value):
+    """Run a JobApplication field's validators; returns None when the value is invalid."""
+    try:
+        return JobApplication._meta.get_field(name).clean(value, None)
+    except ValidationError:
+        return None
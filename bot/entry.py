@@ -0,0 +1,18 @@
+"""
+Lightweight URL entry points for the bot.
+
+Importing bot.views pulls in telebot and requests, builds the TeleBot and
+registers every handler, so it is deferred until the first webhook hit.
+"""
+from django.views.decorators.csrf import csrf_exempt
+
+
+@csrf_exempt
+def telegram_webhook(request):
+    from .views import telegram_webhook as view
+    return view(request)
+
+
+def webhook_stats(request):
+    from .views import webhook_stats as view
+    return view(request)
@@ -0,0 +1,106 @@
+import csv
+import tempfile
+from datetime import datetime
+
+import openpyxl
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .models import JobApplication
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+PROGRESS_EVERY = 500
+
+
+def _accessor(field, tz):
+    """Turn one model field into a fast row -> cell value function."""
+    name = field.name
+    if field.is_relation:
+        attname = field.attname
+
+        def related(obj):
+            return str(getattr(obj, name)) if getattr(obj, attname) is not None else ""
+        return related
+
+    def plain(obj):
+        value = getattr(obj, name)
+        # Excel has no timezones: export local wall-clock time
+        if isinstance(value, datetime) and value.tzinfo is not None:
+            return value.astimezone(tz).replace(tzinfo=None)
+        return value
+    return plain
+
+
+def application_columns():
+    """(headers, accessors) for every non-many field of JobApplication."""
+    tz = timezone.get_current_timezone()
+    fields = [
+        field
+        for field in JobApplication._meta.get_fields()
+        if not field.many_to_many and not field.one_to_many
+    ]
+    return [field.name for field in fields], [_accessor(field, tz) for field in fields]
+
+
+def application_rows(queryset, accessors, chunk_size=2000):
+    """Rows in id order; related objects come from one join, only a chunk is in memory."""
+    # defer(None): the admin changelist queryset defers comments
+    queryset = queryset.defer(None).select_related("user", "position", "location").order_by("pk")
+    for app in queryset.iterator(chunk_size=chunk_size):
+        yield [get(app) for get in accessors]
+
+
+def write_applications_xlsx(queryset, fileobj, progress=None):
+    """
+    Write a write-only workbook to fileobj.
+
+    openpyxl's write-only mode flushes rows to disk as they are appended, so
+    memory stays flat regardless of how many applications are exported.
+    progress, if given, is called with the number of rows written so far.
+    """
+    headers, accessors = application_columns()
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Job Applications")
+    ws.append(headers)
+    for n, row in enumerate(application_rows(queryset, accessors), 1):
+        ws.append(row)
+        if progress and n % PROGRESS_EVERY == 0:
+            progress(n)
+    wb.save(fileobj)
+
+
+def applications_xlsx(queryset, filename="job_applications.xlsx"):
+    """The workbook spooled to a temporary file, then streamed."""
+    tmp = tempfile.TemporaryFile()
+    write_applications_xlsx(queryset, tmp)
+    tmp.seek(0)
+    return FileResponse(tmp, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _csv_lines(queryset):
+    headers, accessors = application_columns()
+    writer = csv.writer(_Echo())
+    # BOM so Excel opens the Cyrillic/Uzbek text as UTF-8
+    yield "\ufeff" + writer.writerow(headers)
+    for row in application_rows(queryset, accessors):
+        yield writer.writerow(row)
+
+
+def write_applications_csv(queryset, fileobj, progress=None):
+    """Write the CSV export to a binary fileobj."""
+    for n, line in enumerate(_csv_lines(queryset)):
+        fileobj.write(line.encode("utf-8"))
+        if progress and n and n % PROGRESS_EVERY == 0:
+            progress(n)
+
+
+def applications_csv(queryset, filename="job_applications.csv"):
+    """CSV generated row by row while the response is being sent."""
+    response = StreamingHttpResponse(_csv_lines(queryset), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
@@ -0,0 +1,128 @@
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from telebot import types
+
+from bot import profiles, views
+from bot.models import (
+    ConversationState, JobApplication, JobCategory, Location, Menu, OutboxMessage, Position,
+    TgUser,
+)
+
+BENCH_TELEGRAM_ID = 10**12
+
+
+def message_update(update_id, user, text):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": user["id"], "type": "private"},
+            "from": user,
+            "text": text,
+        },
+    }
+
+
+def callback_update(update_id, user, data):
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": user,
+            "chat_instance": "bench",
+            "data": data,
+            "message": {
+                "message_id": update_id,
+                "date": 0,
+                "chat": {"id": user["id"], "type": "private"},
+                "text": "",
+            },
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = "Compare queries and latency per completed JobApplication: legacy per-step saves vs. drafts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--applications", type=int, default=200)
+
+    def handle(self, *args, **options):
+        # Not wrapped in a transaction: savepoints would distort the query counts
+        category = JobCategory.objects.create(name="Bench")
+        menu, menu_created = Menu.objects.get_or_create(key="bench", defaults={"title": "Bench"})
+        try:
+            self.run(options["applications"], category)
+        finally:
+            bench_users = TgUser.objects.filter(telegram_id__gte=BENCH_TELEGRAM_ID)
+            JobApplication.objects.filter(user__in=bench_users).delete()
+            ConversationState.objects.filter(chat_id__gte=BENCH_TELEGRAM_ID).delete()
+            OutboxMessage.objects.filter(chat_id__gte=BENCH_TELEGRAM_ID).delete()
+            bench_users.delete()
+            category.delete()
+            if menu_created:
+                menu.delete()
+
+    def run(self, n, category):
+        location = Location.objects.create(category=category, name="Bench")
+        position = Position.objects.create(category=category, title="Bench")
+        steps = ["Bench User", "01.01.1990", "Toshkent", "Chilonzor"]
+        tail = ["Bench LLC", "+998901234567"]
+
+        # Legacy flow: placeholder insert, then get + full save per step
+        tg_user = TgUser.objects.create(telegram_id=BENCH_TELEGRAM_ID, first_name="Bench")
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            for _ in range(n):
+                app = JobApplication.objects.create(
+                    user=tg_user, location=location, birth_date="2000-01-01",
+                    region="", phone_number="-", full_name="",
+                )
+                for field, value in [
+                    ("full_name", "Bench User"), ("birth_date", "1990-01-01"),
+                    ("region", "Toshkent"), ("district", "Chilonzor"),
+                    ("position_id", position.id), ("previous_job", "Bench LLC"),
+                    ("phone_number", "+998901234567"),
+                ]:
+                    app = JobApplication.objects.get(id=app.id)
+                    setattr(app, field, value)
+                    app.save()
+            legacy_time = time.perf_counter() - started
+        self.report("legacy", n, legacy_time, ctx.captured_queries)
+
+        # Draft flow: the real handlers, Telegram calls replaced with no-ops
+        # Like the legacy flow, start from users that exist already (they sent /start)
+        users = [{"id": BENCH_TELEGRAM_ID + 1 + i, "is_bot": False, "first_name": "Bench"} for i in range(n)]
+        for user in users:
+            profiles.sync_user(types.User.de_json(user))
+        update_id = 0
+        with mock.patch.object(views.bot, "send_message"), \
+                mock.patch.object(views.bot, "send_location"), \
+                mock.patch("bot.outbox.OutboxSender.deliver"), \
+                mock.patch.object(views.bot, "edit_message_text"), \
+                CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            for user in users:
+                updates = [callback_update(0, user, f"loc_{location.id}")]
+                updates += [message_update(0, user, text) for text in steps]
+                updates += [callback_update(0, user, f"pos_{position.id}")]
+                updates += [message_update(0, user, text) for text in tail]
+                for update in updates:
+                    update_id += 1
+                    update["update_id"] = update_id
+                    views.process_update(update)
+            draft_time = time.perf_counter() - started
+        self.report("draft", n, draft_time, ctx.captured_queries)
+
+    def report(self, label, n, elapsed, queries):
+        app_queries = [q for q in queries if "bot_jobapplication" in q["sql"]]
+        self.stdout.write(
+            f"{label:>7}: {len(queries) / n:6.1f} queries/app "
+            f"({len(app_queries) / n:.1f} on bot_jobapplication), "
+            f"{elapsed / n * 1000:7.2f} ms/app"
+        )
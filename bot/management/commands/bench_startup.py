@@ -0,0 +1,58 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter so nothing is already imported
+PROBE = """
+import json, os, resource, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+if os.environ.get("BENCH_LOAD_BOT"):
+    import bot.views
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    "ms": elapsed * 1000,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "telebot": "telebot" in sys.modules,
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Measure import time and peak RSS of a worker per DEPLOYMENT_ROLE"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+
+    def handle(self, *args, **options):
+        cases = [
+            ("exam", "exam", False),
+            ("admin", "admin", False),
+            ("bot", "bot", False),
+            ("all", "all", False),
+            ("all+bot loaded", "all", True),
+        ]
+        self.stdout.write(f"{'role':<16}{'import ms':>12}{'peak RSS MB':>14}  telebot")
+        for label, role, load_bot in cases:
+            samples = [self.probe(role, load_bot) for _ in range(options["runs"])]
+            ms = sorted(s["ms"] for s in samples)[len(samples) // 2]
+            rss = sorted(s["rss_mb"] for s in samples)[len(samples) // 2]
+            self.stdout.write(f"{label:<16}{ms:>12.1f}{rss:>14.1f}  {samples[0]['telebot']}")
+
+    def probe(self, role, load_bot):
+        env = dict(os.environ, DEPLOYMENT_ROLE=role, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        env.pop("BENCH_LOAD_BOT", None)
+        if load_bot:
+            env["BENCH_LOAD_BOT"] = "1"
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE], env=env, cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        )
+        return json.loads(out.stdout.strip().splitlines()[-1])
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from bot.outbox import OutboxSender
+
+
+class Command(BaseCommand):
+    help = "Deliver pending OutboxMessage rows to Telegram, honoring rate limits and retry_after"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Process one batch and exit")
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--idle-sleep", type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        sender = OutboxSender()
+        while True:
+            released = sender.release_stale()
+            if released:
+                self.stdout.write(self.style.WARNING(f"Released {released} stale messages"))
+
+            processed = sender.run_once(options["batch_size"])
+            if processed:
+                self.stdout.write(f"Processed {processed} messages")
+            if options["once"]:
+                return
+
+            close_old_connections()
+            if not processed:
+                time.sleep(max(options["idle_sleep"], sender.client.breaker.retry_in()))
@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bot.outbound import CircuitOpen, TelegramError
+from bot.polling import Poller
+
+
+class Command(BaseCommand):
+    help = "Run the bot with getUpdates long polling instead of the webhook"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=settings.BOT_UPDATE_WORKERS)
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--timeout", type=int, default=30, help="Long polling timeout in seconds")
+        parser.add_argument(
+            "--delete-webhook", action="store_true",
+            help="Remove the webhook first; Telegram refuses getUpdates while one is set",
+        )
+
+    def handle(self, *args, **options):
+        from bot.views import process_update
+
+        poller = Poller(
+            process_update,
+            workers=options["workers"],
+            batch_size=options["batch_size"],
+            timeout=options["timeout"],
+            allowed_updates=settings.BOT_WEBHOOK_ALLOWED_UPDATES,
+        )
+        if options["delete_webhook"]:
+            poller.client.call("deleteWebhook", {})
+
+        poller.start()
+        self.stdout.write(self.style.SUCCESS(f"Polling from offset {poller.offset}"))
+        while True:
+            try:
+                count = poller.poll_once()
+            except CircuitOpen as e:
+                time.sleep(e.retry_after or 1)
+                continue
+            except TelegramError as e:
+                self.stderr.write(f"getUpdates failed: {e}")
+                time.sleep(e.retry_after or 5)
+                continue
+            if count:
+                self.stdout.write(f"Handled {count} updates, next offset {poller.offset}")
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bot.broadcast import BroadcastRunner
+from bot.models import Broadcast
+
+
+class Command(BaseCommand):
+    help = "Send (or resume) a Broadcast to every matching active TgUser"
+
+    def add_arguments(self, parser):
+        parser.add_argument("broadcast_id", type=int)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            broadcast = Broadcast.objects.get(pk=options["broadcast_id"])
+        except Broadcast.DoesNotExist:
+            raise CommandError("Broadcast not found")
+        if broadcast.status == Broadcast.DONE:
+            raise CommandError("Broadcast already finished")
+
+        if broadcast.last_user_id:
+            self.stdout.write(f"Resuming after TgUser #{broadcast.last_user_id}")
+
+        finished = BroadcastRunner(
+            broadcast,
+            concurrency=options["concurrency"],
+            batch_size=options["batch_size"],
+        ).run()
+
+        broadcast.refresh_from_db()
+        summary = f"sent={broadcast.sent} failed={broadcast.failed} blocked={broadcast.blocked}"
+        if finished:
+            self.stdout.write(self.style.SUCCESS(f"Broadcast finished: {summary}"))
+        else:
+            self.stdout.write(self.style.WARNING(f"Broadcast paused: {summary}"))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bot.outbound import TelegramError
+from bot.webhook import desired_webhook, ensure_webhook
+
+
+class Command(BaseCommand):
+    help = "Register the Telegram webhook if getWebhookInfo differs from the configured one"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Call setWebhook even if nothing changed")
+
+    def handle(self, *args, **options):
+        try:
+            result = ensure_webhook(force=options["force"])
+        except TelegramError as e:
+            raise CommandError(f"Telegram error: {e}")
+
+        url = desired_webhook()["url"]
+        if result == "updated":
+            self.stdout.write(self.style.SUCCESS(f"Webhook set to {url}"))
+        elif result == "unchanged":
+            self.stdout.write(f"Webhook already set to {url}")
+        else:
+            self.stdout.write(self.style.WARNING("Another process is syncing the webhook"))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0005_conversationstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pagecontent',
+            name='image_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='pagecontent',
+            name='telegram_file_id',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
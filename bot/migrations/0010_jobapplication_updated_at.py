@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0009_botcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobapplication',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0010_jobapplication_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='jobapplication',
+            index=models.Index(fields=['status', 'created_at'], name='bot_jobappl_status_9f1829_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jobapplication',
+            index=models.Index(fields=['location', 'created_at'], name='bot_jobappl_locatio_fc4691_idx'),
+        ),
+    ]
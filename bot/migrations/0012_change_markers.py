@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0011_jobapplication_bot_jobappl_status_9f1829_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='position',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='tguser',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0012_change_markers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='broadcast',
+            name='retry_user_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import hashlib
+
 from django.db import models
 from django.utils.timezone import now
 
@@ -13,6 +15,7 @@ class TgUser(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Joined')
 
     deleted = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         full_name = f"{self.first_name} {self.last_name or ''}".strip()
@@ -46,6 +49,7 @@ class Location(models.Model):
     # Add coordinates
     latitude = models.FloatField(blank=True, null=True)
     longitude = models.FloatField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -54,6 +58,7 @@ class Location(models.Model):
 class Position(models.Model):
     category = models.ForeignKey(JobCategory, on_delete=models.SET_NULL, null=True)
     title = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
@@ -73,6 +78,7 @@ class JobApplication(models.Model):
 
     phone_number = models.CharField(max_length=20)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     status = models.CharField(
         max_length=20,
@@ -87,6 +93,13 @@ class JobApplication(models.Model):
 
     comments = models.TextField(blank=True, null=True)  # <--- NEW FIELD
 
+    class Meta:
+        # Admin filters, newest first
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["location", "created_at"]),
+        ]
+
     def __str__(self):
         return f"{self.user.full_name} – {self.position}"
 
@@ -97,5 +110,132 @@ class PageContent(models.Model):
     text = models.TextField()
     image = models.ImageField(upload_to='content/', blank=True, null=True)
 
+    # Telegram file_id of the uploaded image, valid while image_hash matches
+    telegram_file_id = models.CharField(max_length=255, blank=True)
+    image_hash = models.CharField(max_length=64, blank=True)
+
     def __str__(self):
         return self.key
+
+    def save(self, *args, **kwargs):
+        if not self.image:
+            self.image_hash = ""
+            self.telegram_file_id = ""
+        elif not self.image._committed:
+            # A new file was uploaded: the old file_id points at the old image
+            digest = hash_file(self.image)
+            if digest != self.image_hash:
+                self.image_hash = digest
+                self.telegram_file_id = ""
+        super().save(*args, **kwargs)
+
+
+def hash_file(file):
+    sha = hashlib.sha256()
+    for chunk in file.chunks():
+        sha.update(chunk)
+    file.seek(0)
+    return sha.hexdigest()
+
+
+class ConversationState(models.Model):
+    """Per-chat conversation state shared by every worker process."""
+    chat_id = models.BigIntegerField()
+    kind = models.CharField(max_length=20)
+    data = models.JSONField(default=dict)
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("chat_id", "kind")
+
+    def __str__(self):
+        return f"{self.chat_id}:{self.kind} v{self.version}"
+
+
+class OutboxMessage(models.Model):
+    """Bot API call recorded in the same transaction as the change that caused it."""
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+
+    method = models.CharField(max_length=50)
+    chat_id = models.BigIntegerField()
+    payload = models.JSONField(default=dict)
+
+    status = models.CharField(
+        max_length=10,
+        choices=[
+            (PENDING, "Pending"),
+            (SENDING, "Sending"),
+            (SENT, "Sent"),
+            (FAILED, "Failed"),
+        ],
+        default=PENDING,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=now)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"{self.method} → {self.chat_id} ({self.status})"
+
+
+class Broadcast(models.Model):
+    DRAFT = "draft"
+    RUNNING = "running"
+    PAUSED = "paused"
+    DONE = "done"
+
+    text = models.TextField()
+
+    # Optional audience filters; empty means every active user
+    language_code = models.CharField(max_length=10, blank=True)
+    position = models.ForeignKey(Position, on_delete=models.SET_NULL, null=True, blank=True)
+    location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, blank=True)
+
+    status = models.CharField(
+        max_length=10,
+        choices=[
+            (DRAFT, "Draft"),
+            (RUNNING, "Running"),
+            (PAUSED, "Paused"),
+            (DONE, "Done"),
+        ],
+        default=DRAFT,
+    )
+    # Keyset checkpoint: every TgUser with pk <= last_user_id has been handled
+    last_user_id = models.BigIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    blocked = models.PositiveIntegerField(default=0)
+    # TgUser pks hit by a transient error, tried again before the broadcast is done
+    retry_user_ids = models.JSONField(default=list, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.text[:40]} ({self.status})"
+
+
+class BotCheckpoint(models.Model):
+    """
+    Named, monotonically advancing counter (polling offsets, update_id
+    high-water marks); only checkpoints.reset moves one backwards.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}={self.value}"
@@ -0,0 +1,268 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramError(Exception):
+    def __init__(self, description, error_code=None, retry_after=None):
+        super().__init__(description)
+        self.description = description
+        self.error_code = error_code
+        self.retry_after = retry_after
+
+    @property
+    def is_permanent(self):
+        """4xx other than 429: retrying the same request will not help."""
+        return self.error_code is not None and 400 <= self.error_code < 500 and self.error_code != 429
+
+
+class CircuitOpen(TelegramError):
+    def __init__(self, retry_in):
+        super().__init__(f"Telegram circuit open, retry in {retry_in:.0f}s", retry_after=retry_in)
+
+
+class SharedBudget:
+    """
+    The bot-wide send slot and 429 pause, kept in an flock-guarded file so
+    every process on the host (web workers, run_outbox, send_broadcast)
+    draws from one budget. Times are wall-clock seconds.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+
+    def _update(self, change):
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            stored = os.pread(fd, 64, 0).split()
+            next_slot, paused_until = map(float, stored) if len(stored) == 2 else (0.0, 0.0)
+            result, next_slot, paused_until = change(next_slot, paused_until)
+            os.ftruncate(fd, 0)
+            os.pwrite(fd, f"{next_slot:.6f} {paused_until:.6f}".encode(), 0)
+            return result
+        finally:
+            os.close(fd)  # also releases the lock
+
+    def book(self, earliest, interval):
+        """Take the first free slot at or after `earliest`; returns it."""
+        def take(next_slot, paused_until):
+            slot = max(earliest, next_slot, paused_until)
+            return slot, slot + interval, paused_until
+        return self._update(take)
+
+    def pause(self, until):
+        self._update(lambda next_slot, paused_until: (None, next_slot, max(paused_until, until)))
+
+
+class RateLimiter:
+    """
+    Limits for Telegram's ~30 messages/s overall and ~1 message/s per chat.
+
+    Each chat keeps a theoretical arrival time (GCRA), so a short burst of
+    `per_chat_burst` messages -- e.g. a reply plus a keyboard -- goes out at
+    once while a sustained stream is spaced out. acquire() blocks until the
+    send is allowed.
+
+    The overall limit is per process unless a `shared` SharedBudget is
+    given; with several hosts, each needs its share of the rate.
+    """
+
+    def __init__(self, global_rate=30.0, per_chat_rate=1.0, per_chat_burst=3, max_chats=10000, shared=None):
+        self.global_interval = 1.0 / global_rate
+        self.chat_interval = 1.0 / per_chat_rate
+        self.chat_tolerance = (per_chat_burst - 1) * self.chat_interval
+        self.max_chats = max_chats
+        self.shared = shared
+        self._next_global = 0.0
+        self._chat_tat = OrderedDict()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds):
+        """Stop all sends for a while (Telegram answered 429 with retry_after)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        if self.shared is not None:
+            self.shared.pause(time.time() + seconds)
+
+    def _book(self, now, earliest):
+        if self.shared is None:
+            slot = max(earliest, self._next_global)
+            self._next_global = slot + self.global_interval
+            return slot
+        wall = time.time()
+        return now + self.shared.book(wall + earliest - now, self.global_interval) - wall
+
+    def reserve(self, chat_id=None):
+        """Book the next slot and return how long the caller has to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            earliest = max(now, self._paused_until)
+            if chat_id is not None:
+                tat = self._chat_tat.get(chat_id, 0.0)
+                earliest = max(earliest, tat - self.chat_tolerance)
+            slot = self._book(now, earliest)
+            if chat_id is not None:
+                self._chat_tat[chat_id] = max(tat, slot) + self.chat_interval
+                self._chat_tat.move_to_end(chat_id)
+                while len(self._chat_tat) > self.max_chats:
+                    self._chat_tat.popitem(last=False)
+            return slot - now
+
+    def acquire(self, chat_id=None):
+        wait = self.reserve(chat_id)
+        if wait > 0:
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures and lets one probe through after `reset_timeout`."""
+
+    def __init__(self, threshold=5, reset_timeout=30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0 or self._probing:
+                raise CircuitOpen(max(remaining, 0))
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+    def retry_in(self):
+        """Seconds until a call may be attempted again; 0 when closed or ready to probe."""
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+
+class TelegramClient:
+    """
+    Pooled HTTP client for the Bot API with rate limiting, retry_after
+    handling and a circuit breaker.
+
+    `request` has the signature telebot expects from
+    apihelper.CUSTOM_REQUEST_SENDER, so TeleBot calls go through it too.
+    """
+
+    def __init__(self, token, api_url=None, pool_size=10, max_retry_wait=5.0,
+                 limiter=None, breaker=None):
+        self.token = token
+        self.api_url = (api_url or "https://api.telegram.org").rstrip("/")
+        self.max_retry_wait = max_retry_wait
+        self.limiter = limiter or RateLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def method_url(self, method_name):
+        return f"{self.api_url}/bot{self.token}/{method_name}"
+
+    def request(self, method, url, params=None, files=None, timeout=None, proxies=None, json_body=None):
+        chat_id = (params or json_body or {}).get("chat_id")
+        for attempt in range(3):
+            self.breaker.before_call()
+            self.limiter.acquire(chat_id)
+            try:
+                response = self.session.request(
+                    method, url, params=params, files=files, json=json_body,
+                    timeout=timeout or (5, 30), proxies=proxies,
+                )
+            except requests.RequestException:
+                self.breaker.record_failure()
+                raise
+
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+                return response
+            self.breaker.record_success()
+
+            if response.status_code != 429:
+                return response
+            retry_after = _retry_after(response)
+            self.limiter.pause(retry_after)
+            if retry_after > self.max_retry_wait or attempt == 2:
+                return response
+            logger.warning("Telegram 429 on %s, retrying in %ss", url.rsplit("/", 1)[-1], retry_after)
+        return response
+
+    def call(self, method_name, payload, timeout=None):
+        """Call a Bot API method with a JSON body; returns `result` or raises TelegramError."""
+        try:
+            response = self.request("post", self.method_url(method_name), json_body=payload, timeout=timeout)
+        except requests.RequestException as e:
+            raise TelegramError(str(e))
+        try:
+            data = response.json()
+        except ValueError:
+            raise TelegramError(f"HTTP {response.status_code}", error_code=response.status_code)
+        if not data.get("ok"):
+            raise TelegramError(
+                data.get("description", ""),
+                error_code=data.get("error_code", response.status_code),
+                retry_after=(data.get("parameters") or {}).get("retry_after"),
+            )
+        return data["result"]
+
+
+def _retry_after(response):
+    try:
+        return float(response.json()["parameters"]["retry_after"])
+    except (ValueError, KeyError, TypeError, json.JSONDecodeError):
+        return 1.0
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                shared = SharedBudget(settings.TELEGRAM_RATE_FILE) if settings.TELEGRAM_RATE_FILE else None
+                _client = TelegramClient(
+                    settings.TELEGRAM_BOT_TOKEN,
+                    api_url=settings.TELEGRAM_API_URL,
+                    pool_size=settings.TELEGRAM_POOL_SIZE,
+                    limiter=RateLimiter(global_rate=settings.TELEGRAM_GLOBAL_RATE, shared=shared),
+                )
+    return _client
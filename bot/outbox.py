@@ -0,0 +1,103 @@
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxMessage
+from .outbound import CircuitOpen, TelegramError, get_client
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 8
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+def enqueue(method, chat_id, deliver_on_commit=True, **params):
+    """
+    Record a Bot API call; call it inside the transaction that makes the change.
+
+    With deliver_on_commit the message is also sent right after the commit,
+    so the user sees no extra delay; run_outbox retries whatever did not go out.
+    """
+    msg = OutboxMessage.objects.create(
+        method=method, chat_id=chat_id, payload={"chat_id": chat_id, **params}
+    )
+    if deliver_on_commit:
+        transaction.on_commit(lambda: OutboxSender().deliver(msg.pk))
+    return msg
+
+
+class OutboxSender:
+    def __init__(self, client=None):
+        self.client = client or get_client()
+
+    def claim(self, pk):
+        """Mark a row as ours; False if another sender already has it."""
+        return bool(
+            OutboxMessage.objects.filter(pk=pk, status=OutboxMessage.PENDING)
+            .update(status=OutboxMessage.SENDING, claimed_at=timezone.now())
+        )
+
+    def deliver(self, pk):
+        if not self.claim(pk):
+            return None
+        msg = OutboxMessage.objects.get(pk=pk)
+        return self._send(msg)
+
+    def _send(self, msg):
+        try:
+            self.client.call(msg.method, msg.payload)
+        except TelegramError as e:
+            self._failed(msg, e)
+            return False
+        except Exception as e:
+            logger.exception("Outbox message %s failed", msg.pk)
+            self._failed(msg, TelegramError(str(e)))
+            return False
+
+        OutboxMessage.objects.filter(pk=msg.pk).update(
+            status=OutboxMessage.SENT, attempts=msg.attempts + 1, sent_at=timezone.now(),
+        )
+        return True
+
+    def _failed(self, msg, error):
+        attempts = msg.attempts
+        if not isinstance(error, CircuitOpen):
+            attempts += 1
+
+        if error.is_permanent or attempts >= MAX_ATTEMPTS:
+            status, delay = OutboxMessage.FAILED, 0
+        elif error.retry_after:
+            status, delay = OutboxMessage.PENDING, error.retry_after
+        else:
+            status, delay = OutboxMessage.PENDING, min(2 ** attempts, 300)
+
+        OutboxMessage.objects.filter(pk=msg.pk).update(
+            status=status,
+            attempts=attempts,
+            last_error=str(error)[:1000],
+            next_attempt_at=timezone.now() + timedelta(seconds=delay),
+        )
+
+    def release_stale(self):
+        """Hand rows claimed by a sender that died back to the queue."""
+        return OutboxMessage.objects.filter(
+            status=OutboxMessage.SENDING, claimed_at__lt=timezone.now() - CLAIM_TIMEOUT
+        ).update(status=OutboxMessage.PENDING)
+
+    def run_once(self, batch_size=100):
+        """Send due messages in id order; returns the number processed."""
+        due = list(
+            OutboxMessage.objects.filter(
+                status=OutboxMessage.PENDING, next_attempt_at__lte=timezone.now()
+            ).order_by("id").values_list("pk", flat=True)[:batch_size]
+        )
+        processed = 0
+        for pk in due:
+            if self.client.breaker.retry_in() > 0:
+                break
+            if self.claim(pk):
+                self._send(OutboxMessage.objects.get(pk=pk))
+                processed += 1
+        return processed
@@ -0,0 +1,69 @@
+import logging
+
+from . import checkpoints
+from .dispatcher import UpdateDispatcher, update_chat_id
+from .outbound import get_client
+
+logger = logging.getLogger(__name__)
+
+OFFSET = "polling_offset"
+
+
+class Poller:
+    """
+    getUpdates loop feeding the same process_update the webhook uses.
+
+    Updates go through UpdateDispatcher, so each chat keeps its order while
+    chats run in parallel. Every worker shard records the last update_id it
+    finished; since a shard handles its updates in id order, that mark is
+    exact, and after a restart the re-fetched tail of an interrupted batch is
+    skipped instead of being handled twice. The getUpdates offset itself is
+    stored after every batch.
+    """
+
+    def __init__(self, handler, client=None, workers=4, batch_size=100, timeout=30, allowed_updates=None):
+        self.handler = handler
+        self.client = client or get_client()
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.allowed_updates = allowed_updates
+        self.dispatcher = UpdateDispatcher(self._process, workers=workers, maxsize=workers * batch_size)
+        self.done = {shard: checkpoints.get(self._shard_name(shard)) for shard in range(self.dispatcher.workers)}
+        self.offset = checkpoints.get(OFFSET)
+
+    def _shard_name(self, shard):
+        return f"polling_done:{self.dispatcher.workers}:{shard}"
+
+    def _process(self, item):
+        shard, update = item
+        update_id = update["update_id"]
+        self.handler(update)
+        checkpoints.advance(self._shard_name(shard), update_id)
+
+    def fetch(self):
+        payload = {"offset": self.offset, "limit": self.batch_size, "timeout": self.timeout}
+        if self.allowed_updates:
+            payload["allowed_updates"] = self.allowed_updates
+        return self.client.call("getUpdates", payload, timeout=(5, self.timeout + 10))
+
+    def poll_once(self):
+        """Fetch one batch, process it and advance the offset; returns the batch size."""
+        updates = self.fetch()
+        if not updates:
+            return 0
+
+        for update in updates:
+            chat_id = update_chat_id(update)
+            shard = chat_id % self.dispatcher.workers
+            if update["update_id"] <= self.done[shard]:
+                continue
+            while not self.dispatcher.submit(chat_id, (shard, update)):
+                self.dispatcher.join()
+        self.dispatcher.join()
+
+        self.offset = updates[-1]["update_id"] + 1
+        checkpoints.advance(OFFSET, self.offset)
+        return len(updates)
+
+    def start(self):
+        self.dispatcher.start()
@@ -0,0 +1,93 @@
+import threading
+from collections import OrderedDict
+
+from .models import TgUser
+
+
+class ProfileCache:
+    """
+    In-process LRU of telegram_id -> (pk, profile fingerprint).
+
+    A TgUser row is only written when the fingerprint differs from what we
+    last stored, so repeat messages from the same user cost no queries.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, telegram_id):
+        with self._lock:
+            entry = self._data.get(telegram_id)
+            if entry is not None:
+                self._data.move_to_end(telegram_id)
+            return entry
+
+    def set(self, telegram_id, pk, fingerprint):
+        with self._lock:
+            self._data[telegram_id] = (pk, fingerprint)
+            self._data.move_to_end(telegram_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, telegram_id):
+        with self._lock:
+            self._data.pop(telegram_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+profile_cache = ProfileCache()
+
+
+def fingerprint(tg_user):
+    return (
+        tg_user.first_name,
+        tg_user.last_name,
+        tg_user.username,
+        tg_user.is_bot,
+        tg_user.language_code or "",
+    )
+
+
+def sync_user(tg_user):
+    """Upsert a telebot User into TgUser only when the profile changed; returns the pk."""
+    fp = fingerprint(tg_user)
+    cached = profile_cache.get(tg_user.id)
+    if cached is not None and cached[1] == fp:
+        return cached[0]
+
+    first_name, last_name, username, is_bot, language_code = fp
+    instance, _ = TgUser.objects.update_or_create(
+        telegram_id=tg_user.id,
+        defaults={
+            "first_name": first_name,
+            "last_name": last_name,
+            "username": username,
+            "is_bot": is_bot,
+            "language_code": language_code,
+            "deleted": False,
+        },
+    )
+    profile_cache.set(tg_user.id, instance.pk, fp)
+    return instance.pk
+
+
+def mark_deleted(telegram_id):
+    TgUser.objects.filter(telegram_id=telegram_id).update(deleted=True)
+    # Dropping the entry forces the next message to rewrite deleted=False
+    profile_cache.discard(telegram_id)
+
+
+
+def mark_deleted_many(telegram_ids):
+    """Bulk variant of mark_deleted, used when a broadcast hits blocked users."""
+    telegram_ids = list(telegram_ids)
+    if not telegram_ids:
+        return 0
+    for telegram_id in telegram_ids:
+        profile_cache.discard(telegram_id)
+    return TgUser.objects.filter(telegram_id__in=telegram_ids).update(deleted=True)
@@ -0,0 +1,18 @@
+import sys
+
+from django.db.models.signals import post_delete, post_save
+
+from .models import JobCategory, Location, Menu, Position
+
+
+def invalidate_catalog(**kwargs):
+    # Only processes that loaded the bot stack have a catalog to drop
+    module = sys.modules.get("bot.catalog")
+    if module is not None:
+        module.catalog.invalidate()
+
+
+def connect():
+    for model in (Menu, JobCategory, Location, Position):
+        post_save.connect(invalidate_catalog, sender=model, dispatch_uid=f"catalog-save-{model.__name__}")
+        post_delete.connect(invalidate_catalog, sender=model, dispatch_uid=f"catalog-delete-{model.__name__}")
@@ -0,0 +1,391 @@
+import fcntl
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from telebot import Handler
+from telebot.handler_backends import HandlerBackend
+
+from .models import ConversationState
+
+
+class StateConflict(Exception):
+    """Raised when a chat's state was changed by another worker in between."""
+
+
+# ================================
+#  Stores: (chat_id, kind) -> (version, data)
+# ================================
+class StateStore:
+    def pop(self, chat_id, kind):
+        """Remove and return the row; None if absent or another worker popped it first."""
+        row = self.get(chat_id, kind)
+        if row is None or not self.delete(chat_id, kind, row[0]):
+            return None
+        return row
+
+
+class DatabaseStateStore(StateStore):
+    def get(self, chat_id, kind):
+        row = (
+            ConversationState.objects
+            .filter(chat_id=chat_id, kind=kind)
+            .values_list("version", "data")
+            .first()
+        )
+        return row
+
+    def version(self, chat_id, kind):
+        return (
+            ConversationState.objects
+            .filter(chat_id=chat_id, kind=kind)
+            .values_list("version", flat=True)
+            .first()
+        )
+
+    def put(self, chat_id, kind, data, expected_version=None):
+        """Write data if the stored version still equals expected_version (None = absent)."""
+        if expected_version is None:
+            try:
+                with transaction.atomic():
+                    ConversationState.objects.create(chat_id=chat_id, kind=kind, data=data)
+            except IntegrityError:
+                raise StateConflict(chat_id)
+            return 1
+
+        updated = ConversationState.objects.filter(
+            chat_id=chat_id, kind=kind, version=expected_version
+        ).update(data=data, version=F("version") + 1)
+        if not updated:
+            raise StateConflict(chat_id)
+        return expected_version + 1
+
+    def delete(self, chat_id, kind, expected_version=None):
+        qs = ConversationState.objects.filter(chat_id=chat_id, kind=kind)
+        if expected_version is not None:
+            qs = qs.filter(version=expected_version)
+        deleted, _ = qs.delete()
+        return bool(deleted)
+
+
+class MemoryStateStore(StateStore):
+    """Process-local store; only suitable for a single worker process."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, chat_id, kind):
+        return self._data.get((chat_id, kind))
+
+    def version(self, chat_id, kind):
+        row = self._data.get((chat_id, kind))
+        return row[0] if row else None
+
+    def put(self, chat_id, kind, data, expected_version=None):
+        with self._lock:
+            if self.version(chat_id, kind) != expected_version:
+                raise StateConflict(chat_id)
+            version = (expected_version or 0) + 1
+            self._data[(chat_id, kind)] = (version, data)
+            return version
+
+    def delete(self, chat_id, kind, expected_version=None):
+        with self._lock:
+            row = self._data.get((chat_id, kind))
+            if row is None or (expected_version is not None and row[0] != expected_version):
+                return False
+            del self._data[(chat_id, kind)]
+            return True
+
+
+class FileStateStore(StateStore):
+    """One JSON file per chat and kind, guarded by an flock so several processes can share it."""
+
+    def __init__(self, directory):
+        self.directory = str(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, chat_id, kind):
+        return os.path.join(self.directory, f"{kind}-{chat_id}.json")
+
+    def _locked(self, chat_id, kind):
+        fd = os.open(self._path(chat_id, kind) + ".lock", os.O_CREAT | os.O_RDWR, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+
+    def _unlock(self, fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def _read(self, chat_id, kind):
+        try:
+            with open(self._path(chat_id, kind)) as fh:
+                stored = json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return None
+        return stored["version"], stored["data"]
+
+    def get(self, chat_id, kind):
+        return self._read(chat_id, kind)
+
+    def version(self, chat_id, kind):
+        row = self._read(chat_id, kind)
+        return row[0] if row else None
+
+    def put(self, chat_id, kind, data, expected_version=None):
+        fd = self._locked(chat_id, kind)
+        try:
+            row = self._read(chat_id, kind)
+            current = row[0] if row else None
+            if current != expected_version:
+                raise StateConflict(chat_id)
+            version = (current or 0) + 1
+            path = self._path(chat_id, kind)
+            with open(path + ".tmp", "w") as fh:
+                json.dump({"version": version, "data": data}, fh)
+            os.replace(path + ".tmp", path)
+            return version
+        finally:
+            self._unlock(fd)
+
+    def delete(self, chat_id, kind, expected_version=None):
+        fd = self._locked(chat_id, kind)
+        try:
+            row = self._read(chat_id, kind)
+            if row is None or (expected_version is not None and row[0] != expected_version):
+                return False
+            os.remove(self._path(chat_id, kind))
+            return True
+        finally:
+            self._unlock(fd)
+
+
+class CachedStateStore(StateStore):
+    """
+    Hot in-process LRU in front of a shared store.
+
+    Cached payloads are only served while their version still matches the
+    shared store, so any worker can pick up a chat without sticky routing.
+    Chats known to have no state are answered without a query for up to
+    negative_ttl seconds, or until this worker writes them.
+    """
+
+    def __init__(self, backend, maxsize=5000, negative_ttl=2.0):
+        self.backend = backend
+        self.maxsize = maxsize
+        self.negative_ttl = negative_ttl
+        self._data = OrderedDict()
+        self._absent = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key, row):
+        with self._lock:
+            if row is None:
+                self._data.pop(key, None)
+                self._absent[key] = time.monotonic() + self.negative_ttl
+                self._absent.move_to_end(key)
+                while len(self._absent) > self.maxsize:
+                    self._absent.popitem(last=False)
+                return
+            self._absent.pop(key, None)
+            self._data[key] = row
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def _forget(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._absent.pop(key, None)
+
+    def get(self, chat_id, kind):
+        key = (chat_id, kind)
+        with self._lock:
+            cached = self._data.get(key)
+            absent_until = self._absent.get(key)
+        if absent_until is not None and time.monotonic() < absent_until:
+            return None
+        if cached is not None:
+            if self.backend.version(chat_id, kind) == cached[0]:
+                return cached
+        row = self.backend.get(chat_id, kind)
+        self._remember(key, row)
+        return row
+
+    def version(self, chat_id, kind):
+        return self.backend.version(chat_id, kind)
+
+    def put(self, chat_id, kind, data, expected_version=None):
+        try:
+            version = self.backend.put(chat_id, kind, data, expected_version)
+        except StateConflict:
+            self._forget((chat_id, kind))
+            raise
+        self._remember((chat_id, kind), (version, data))
+        return version
+
+    def delete(self, chat_id, kind, expected_version=None):
+        self._forget((chat_id, kind))
+        return self.backend.delete(chat_id, kind, expected_version)
+
+    def pop(self, chat_id, kind):
+        with self._lock:
+            cached = self._data.pop((chat_id, kind), None)
+            self._absent.pop((chat_id, kind), None)
+        # A version-conditional delete doubles as the freshness check
+        if cached is not None and self.backend.delete(chat_id, kind, cached[0]):
+            return cached
+        return self.backend.pop(chat_id, kind)
+
+
+# ================================
+#  Next-step handlers on top of a store
+# ================================
+_step_registry = {}
+
+
+def step(func):
+    """Register a next-step callback so it can be restored by name in any worker."""
+    _step_registry[func.__name__] = func
+    return func
+
+
+class StateHandlerBackend(HandlerBackend):
+    """
+    telebot next-step backend persisting handlers as {callback name, args}.
+
+    A chat keeps its row once created. Running a step claims the version it
+    was read at, and whatever the step registers next overwrites the row
+    with a single version-conditional UPDATE; a step that registers nothing
+    leaves an empty handler list behind.
+    """
+
+    kind = "step"
+
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+        self._local = threading.local()
+
+    def _claims(self):
+        return self._local.__dict__.setdefault("claims", {})
+
+    def register_handler(self, handler_group_id, handler):
+        name = handler.callback.__name__
+        if _step_registry.get(name) is not handler.callback:
+            raise ValueError(f"{name} is not registered with @state.step")
+        entry = {"callback": name, "args": list(handler.args), "kwargs": handler.kwargs}
+
+        claim = self._claims().get(handler_group_id)
+        if claim is not None:
+            if claim["lost"]:
+                return
+            # Replaces the step that is running right now
+            version, handlers = claim["version"], claim["handlers"]
+        else:
+            row = self.store.get(handler_group_id, self.kind)
+            version, handlers = row if row else (None, [])
+
+        for _ in range(3):
+            try:
+                version = self.store.put(handler_group_id, self.kind, handlers + [entry], version)
+            except StateConflict:
+                if claim is not None:
+                    # Another worker ran this step as well; its next step stands
+                    claim["lost"] = True
+                    return
+                row = self.store.get(handler_group_id, self.kind)
+                version, handlers = row if row else (None, [])
+                continue
+            if claim is not None:
+                claim.update(version=version, handlers=handlers + [entry])
+            return
+        raise StateConflict(handler_group_id)
+
+    def clear_handlers(self, handler_group_id):
+        self.store.delete(handler_group_id, self.kind)
+
+    def get_handlers(self, handler_group_id):
+        row = self.store.get(handler_group_id, self.kind)
+        if not row or not row[1]:
+            return None
+        version, handlers = row
+        known = [h for h in handlers if h["callback"] in _step_registry]
+        claim = {"version": version, "handlers": [], "pending": len(known), "lost": False}
+        if not known:
+            self._release(handler_group_id, claim)
+            return None
+        return [
+            Handler(
+                self._claiming(handler_group_id, claim, _step_registry[h["callback"]]),
+                *h["args"], **h["kwargs"],
+            )
+            for h in known
+        ]
+
+    def resume(self, handler_group_id, callback, message, **extra):
+        """
+        Run the pending step from outside a message (e.g. an inline keyboard
+        callback), passing extra keyword arguments along. Returns False,
+        claiming nothing, unless callback is the only step pending.
+        """
+        row = self.store.get(handler_group_id, self.kind)
+        if not row or [h["callback"] for h in row[1]] != [callback.__name__]:
+            return False
+        version, (pending,) = row
+        claim = {"version": version, "handlers": [], "pending": 1, "lost": False}
+        run = self._claiming(handler_group_id, claim, callback)
+        run(message, *pending["args"], **pending["kwargs"], **extra)
+        return True
+
+    def _claiming(self, chat_id, claim, callback):
+        def run(message, *args, **kwargs):
+            claims = self._claims()
+            claims[chat_id] = claim
+            try:
+                return callback(message, *args, **kwargs)
+            except Exception:
+                # Steps queued behind a failing one do not run
+                claim["pending"] = 1
+                raise
+            finally:
+                claim["pending"] -= 1
+                if not claim["pending"]:
+                    claims.pop(chat_id, None)
+                    self._release(chat_id, claim)
+
+        return run
+
+    def _release(self, chat_id, claim):
+        """Mark the claimed steps done when they registered no successor."""
+        if claim["handlers"] or claim["lost"]:
+            return
+        try:
+            self.store.put(chat_id, self.kind, [], claim["version"])
+        except StateConflict:
+            pass
+
+
+def build_store(name=None):
+    name = name or settings.BOT_STATE_BACKEND
+    if name == "memory":
+        return MemoryStateStore()
+    if name == "db":
+        return CachedStateStore(
+            DatabaseStateStore(), settings.BOT_STATE_CACHE_SIZE, settings.BOT_STATE_NEGATIVE_TTL
+        )
+    if name == "file":
+        return CachedStateStore(
+            FileStateStore(settings.BOT_STATE_DIR), settings.BOT_STATE_CACHE_SIZE, settings.BOT_STATE_NEGATIVE_TTL
+        )
+    raise ValueError(f"Unknown BOT_STATE_BACKEND: {name}")
+
+
+def build_handler_backend():
+    return StateHandlerBackend(build_store())
@@ -1,3 +1,781 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+import openpyxl
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from telebot import Handler, types
+from telebot.apihelper import ApiTelegramException
+
+from conf.testing import QueryPlanTestCase
+
+from . import checkpoints, profiles, state, views
+from .broadcast import BroadcastRunner
+from .catalog import Catalog, catalog
+from .dedup import CHECKPOINT, UpdateDeduplicator
+from .dispatcher import UpdateDispatcher
+from .exports import application_columns, application_rows, applications_csv, applications_xlsx
+from .management.commands.bench_application_wizard import callback_update, message_update
+from .models import (
+    BotCheckpoint, Broadcast, ConversationState, JobApplication, JobCategory, Location, Menu, OutboxMessage,
+    PageContent, Position, TgUser,
+)
+from .outbound import CircuitBreaker, RateLimiter, SharedBudget, TelegramClient
+from .outbox import OutboxSender, enqueue
+from .polling import Poller
+from .webhook import ensure_webhook
+
+
+class FakeBotAPI:
+    """Local Bot API stand-in: replies with queued (status, body) pairs, then `ok`."""
+
+    def __init__(self):
+        self.requests = []
+        self.replies = []
+        self.blocked_chats = set()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)) or 0)
+                payload = json.loads(body or b"{}")
+                fake.requests.append((self.path.rsplit("/", 1)[-1], payload))
+                if payload.get("chat_id") in fake.blocked_chats:
+                    status, reply = 403, {
+                        "ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"
+                    }
+                elif fake.replies:
+                    status, reply = fake.replies.pop(0)
+                else:
+                    status, reply = 200, {"ok": True, "result": {"message_id": len(fake.requests)}}
+                data = json.dumps(reply).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeBotAPIMixin:
+    def setUp(self):
+        self.api = FakeBotAPI()
+        self.addCleanup(self.api.close)
+        self.client = TelegramClient(
+            "1:test",
+            api_url=self.api.url,
+            limiter=RateLimiter(global_rate=1000, per_chat_rate=1000),
+            breaker=CircuitBreaker(threshold=2, reset_timeout=60),
+        )
+
+
+class FakeBotAPITestCase(FakeBotAPIMixin, TestCase):
+    pass
+
+
+class OutboxTests(FakeBotAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.sender = OutboxSender(self.client)
+
+    def test_retry_after_is_honored(self):
+        self.api.replies.append(
+            (429, {"ok": False, "error_code": 429, "description": "Too Many Requests",
+                   "parameters": {"retry_after": 0.05}})
+        )
+        result = self.client.call("sendMessage", {"chat_id": 1, "text": "hi"})
+        self.assertEqual(result, {"message_id": 2})
+        self.assertEqual(len(self.api.requests), 2)
+
+    def test_message_is_sent_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            with transaction.atomic():
+                msg = enqueue("sendMessage", 42, text="Rahmat!")
+        self.assertEqual(len(callbacks), 1)
+
+        self.assertEqual(self.sender.run_once(), 1)
+        msg.refresh_from_db()
+        self.assertEqual(msg.status, OutboxMessage.SENT)
+        self.assertEqual(self.api.requests, [("sendMessage", {"chat_id": 42, "text": "Rahmat!"})])
+
+    def test_permanent_error_fails_without_retry(self):
+        self.api.replies.append((400, {"ok": False, "error_code": 400, "description": "chat not found"}))
+        msg = enqueue("sendMessage", 1, deliver_on_commit=False, text="x")
+        self.sender.run_once()
+        msg.refresh_from_db()
+        self.assertEqual(msg.status, OutboxMessage.FAILED)
+        self.assertEqual(msg.attempts, 1)
+
+    def test_circuit_opens_on_outage(self):
+        for _ in range(2):
+            self.api.replies.append((502, {"ok": False, "error_code": 502, "description": "Bad Gateway"}))
+        for i in range(5):
+            enqueue("sendMessage", i, deliver_on_commit=False, text="x")
+
+        self.sender.run_once()
+        self.assertEqual(len(self.api.requests), 2)
+        self.assertGreater(self.client.breaker.retry_in(), 0)
+        self.assertEqual(OutboxMessage.objects.filter(status=OutboxMessage.PENDING).count(), 5)
+
+
+class RateLimiterTests(TestCase):
+    def test_processes_share_one_global_budget(self):
+        path = os.path.join(tempfile.mkdtemp(), "rate")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        # Two limiters on one file stand in for two worker processes
+        first = RateLimiter(global_rate=10, shared=SharedBudget(path))
+        second = RateLimiter(global_rate=10, shared=SharedBudget(path))
+        waits = [first.reserve(), second.reserve(), first.reserve(), second.reserve()]
+        for expected, wait in zip((0.0, 0.1, 0.2, 0.3), waits):
+            self.assertAlmostEqual(wait, expected, delta=0.03)
+
+    def test_pause_reaches_other_processes(self):
+        path = os.path.join(tempfile.mkdtemp(), "rate")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        RateLimiter(shared=SharedBudget(path)).pause(2)
+        self.assertGreater(RateLimiter(shared=SharedBudget(path)).reserve(), 1.9)
+
+
+class BroadcastTests(FakeBotAPITestCase):
+    def test_broadcast_checkpoints_and_marks_blocked_users(self):
+        for telegram_id in range(1, 8):
+            TgUser.objects.create(telegram_id=telegram_id, first_name="u", language_code="uz")
+        TgUser.objects.create(telegram_id=100, first_name="gone", deleted=True)
+        TgUser.objects.create(telegram_id=101, first_name="ru", language_code="ru")
+        self.api.blocked_chats = {3, 6}
+
+        broadcast = Broadcast.objects.create(text="Yangi vakansiya", language_code="uz")
+        BroadcastRunner(broadcast, client=self.client, concurrency=3, batch_size=3).run()
+
+        broadcast.refresh_from_db()
+        self.assertEqual(broadcast.status, Broadcast.DONE)
+        self.assertEqual((broadcast.sent, broadcast.blocked, broadcast.failed), (5, 2, 0))
+        self.assertEqual(broadcast.last_user_id, TgUser.objects.get(telegram_id=7).pk)
+        self.assertEqual(
+            set(TgUser.objects.filter(deleted=True).values_list("telegram_id", flat=True)), {3, 6, 100}
+        )
+        self.assertEqual(sorted(p["chat_id"] for _, p in self.api.requests), list(range(1, 8)))
+
+    def test_resume_skips_users_before_checkpoint(self):
+        users = [TgUser.objects.create(telegram_id=i, first_name="u") for i in range(1, 5)]
+        broadcast = Broadcast.objects.create(text="x", last_user_id=users[1].pk)
+        BroadcastRunner(broadcast, client=self.client).run()
+        self.assertEqual(sorted(p["chat_id"] for _, p in self.api.requests), [3, 4])
+
+
+    def bad_gateway(self, n):
+        for _ in range(n):
+            self.api.replies.append((502, {"ok": False, "error_code": 502, "description": "Bad Gateway"}))
+
+    def test_transient_failure_is_retried_not_skipped(self):
+        for telegram_id in range(1, 5):
+            TgUser.objects.create(telegram_id=telegram_id, first_name="u")
+        self.bad_gateway(1)
+        broadcast = Broadcast.objects.create(text="x")
+        self.assertTrue(BroadcastRunner(broadcast, client=self.client, concurrency=1, batch_size=2).run())
+
+        broadcast.refresh_from_db()
+        self.assertEqual((broadcast.status, broadcast.sent, broadcast.failed), (Broadcast.DONE, 4, 0))
+        self.assertEqual(broadcast.retry_user_ids, [])
+        self.assertEqual(sorted(p["chat_id"] for _, p in self.api.requests), [1, 1, 2, 3, 4])
+
+    def test_outage_pauses_and_resume_reaches_everyone(self):
+        for telegram_id in range(1, 5):
+            TgUser.objects.create(telegram_id=telegram_id, first_name="u")
+        # Two 502s open the circuit; the rest of the batch is refused locally
+        self.bad_gateway(2)
+        broadcast = Broadcast.objects.create(text="x")
+        self.assertFalse(BroadcastRunner(broadcast, client=self.client, concurrency=1, batch_size=3).run())
+
+        broadcast.refresh_from_db()
+        first_batch = list(TgUser.objects.order_by("pk").values_list("pk", flat=True)[:3])
+        self.assertEqual((broadcast.status, broadcast.sent, broadcast.failed), (Broadcast.PAUSED, 0, 0))
+        self.assertEqual(broadcast.retry_user_ids, first_batch)
+
+        self.client.breaker.record_success()
+        self.api.requests.clear()
+        self.assertTrue(BroadcastRunner(broadcast, client=self.client, concurrency=1, batch_size=3).run())
+        broadcast.refresh_from_db()
+        self.assertEqual((broadcast.status, broadcast.sent), (Broadcast.DONE, 4))
+        self.assertEqual(sorted(p["chat_id"] for _, p in self.api.requests), [1, 2, 3, 4])
+
+
+@override_settings(HOST="bot.example.com")
+class WebhookSyncTests(FakeBotAPITestCase):
+    def webhook_info(self, url):
+        self.api.replies.append((200, {"ok": True, "result": {"url": url, "pending_update_count": 0}}))
+
+    def test_matching_webhook_is_left_alone(self):
+        self.webhook_info("https://bot.example.com/webhook/")
+        self.assertEqual(ensure_webhook(self.client), "unchanged")
+        self.assertEqual([m for m, _ in self.api.requests], ["getWebhookInfo"])
+
+    def test_different_webhook_is_replaced(self):
+        self.webhook_info("https://old.example.com/webhook/")
+        self.assertEqual(ensure_webhook(self.client), "updated")
+        self.assertEqual(
+            self.api.requests[-1], ("setWebhook", {"url": "https://bot.example.com/webhook/"})
+        )
+
+
+# Dispatcher workers write checkpoints on their own connections. One worker,
+# since the in-memory test database locks instead of waiting on concurrent writers.
+class PollingTests(FakeBotAPIMixin, TransactionTestCase):
+    def updates(self, *ids):
+        result = [{"update_id": i, "message": {"chat": {"id": i % 3}}} for i in ids]
+        self.api.replies.append((200, {"ok": True, "result": result}))
+
+    def test_offset_advances_and_handled_updates_are_skipped(self):
+        handled = []
+        poller = Poller(lambda u: handled.append(u["update_id"]), client=self.client, workers=1, timeout=0)
+        poller.start()
+        self.updates(10, 11, 12)
+        self.assertEqual(poller.poll_once(), 3)
+        self.assertEqual(sorted(handled), [10, 11, 12])
+        self.assertEqual(checkpoints.get("polling_offset"), 13)
+        self.assertEqual(self.api.requests[-1][1]["offset"], 0)
+
+        # A crash before the offset was stored makes Telegram send the batch again
+        restarted = Poller(lambda u: handled.append(u["update_id"]), client=self.client, workers=1, timeout=0)
+        restarted.start()
+        self.updates(10, 11, 12, 13)
+        restarted.poll_once()
+        self.assertEqual(sorted(handled), [10, 11, 12, 13])
+        self.assertEqual(restarted.offset, 14)
+
+
+class DedupTests(TestCase):
+    def test_redelivered_update_is_not_processed_again(self):
+        body = json.dumps({"update_id": 501, "message": {"chat": {"id": 1}}})
+        with mock.patch("bot.views.deduplicator", UpdateDeduplicator()) as dedup, \
+                mock.patch("bot.views.process_update") as process_update:
+            for _ in range(3):
+                response = self.client.post("/webhook/", body, content_type="application/json")
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(process_update.call_count, 1)
+        self.assertEqual(dedup.stats()["duplicates"], 2)
+
+    def test_window_and_persisted_mark(self):
+        dedup = UpdateDeduplicator(window=3, in_flight=2)
+        with self.assertNumQueries(0):
+            self.assertTrue(all(dedup.claim(i) for i in (10, 11, 12, 13)))
+            self.assertFalse(dedup.claim(10))  # fell out of the window
+            dedup.release(13)
+            self.assertTrue(dedup.claim(13))
+        dedup.flush()
+
+        restarted = UpdateDeduplicator(in_flight=2)
+        restarted.flush()
+        self.assertFalse(restarted.claim(11))
+        self.assertTrue(restarted.claim(12))
+
+    def test_redelivery_to_another_worker_is_dropped(self):
+        first = UpdateDeduplicator(in_flight=2)
+        second = UpdateDeduplicator(in_flight=2)
+        self.assertTrue(second.claim(1))
+        self.assertTrue(all(first.claim(i) for i in range(2, 20)))
+        first.flush()
+        second.flush()
+        self.assertFalse(second.claim(10))
+
+    def test_restarted_numbering_lowers_the_mark(self):
+        checkpoints.advance(CHECKPOINT, 5_000_000)
+        dedup = UpdateDeduplicator(in_flight=2)
+        other = UpdateDeduplicator(in_flight=2)
+        dedup.flush()
+        other.flush()
+        self.assertTrue(other.claim(5_000_001))
+        self.assertFalse(dedup.claim(4_999_990))  # an ordinary redelivery
+
+        self.assertTrue(dedup.claim(1234))
+        self.assertFalse(dedup.claim(1234))
+        dedup.flush()
+        self.assertEqual(checkpoints.get(CHECKPOINT), 1234)
+        self.assertEqual(dedup.stats()["resets"], 1)
+        # Another process follows the lowered mark instead of dropping everything
+        other.flush()
+        self.assertEqual(checkpoints.get(CHECKPOINT), 1234)
+        self.assertTrue(other.claim(1235))
+
+    def test_update_after_a_quiet_day_is_a_restart(self):
+        checkpoints.advance(CHECKPOINT, 1000)
+        BotCheckpoint.objects.filter(name=CHECKPOINT).update(updated_at=timezone.now() - timezone.timedelta(days=2))
+        dedup = UpdateDeduplicator(in_flight=2)
+        dedup.flush()
+        self.assertTrue(dedup.claim(900))
+        dedup.flush()
+        self.assertEqual(checkpoints.get(CHECKPOINT), 900)
+
+
+class DispatcherTests(TestCase):
+    def test_updates_of_one_chat_are_handled_in_order(self):
+        handled = []
+        lock = threading.Lock()
+
+        def handler(item):
+            chat_id, seq = item
+            time.sleep(0.001 * (seq % 3))
+            with lock:
+                handled.append(item)
+
+        dispatcher = UpdateDispatcher(handler, workers=3)
+        dispatcher.start()
+        for seq in range(10):
+            for chat_id in (1, 2, 3, 4):
+                self.assertTrue(dispatcher.submit(chat_id, (chat_id, seq)))
+        dispatcher.join()
+        for chat_id in (1, 2, 3, 4):
+            self.assertEqual([seq for c, seq in handled if c == chat_id], list(range(10)))
+
+    def test_stats_count_failures_and_rejections(self):
+        def handler(item):
+            if item == "bad":
+                raise ValueError(item)
+
+        dispatcher = UpdateDispatcher(handler, workers=1, maxsize=2)
+        self.assertTrue(dispatcher.submit(1, "ok"))
+        self.assertTrue(dispatcher.submit(1, "bad"))
+        self.assertFalse(dispatcher.submit(1, "late"))  # not started yet, queue is full
+        with self.assertLogs("bot.dispatcher", "ERROR"):
+            dispatcher.start()
+            dispatcher.join()
+
+        stats = dispatcher.stats()
+        self.assertEqual((stats["processed"], stats["failed"], stats["rejected"], stats["depth"]), (2, 1, 1, 0))
+        self.assertIsNotNone(stats["latency_ms"]["p95"])
+
+    @override_settings(BOT_UPDATE_MODE="queue")
+    def test_full_queue_answers_503_and_forgets_the_update(self):
+        full = UpdateDispatcher(lambda item: None, workers=1, maxsize=1)
+        full.submit(1, "waiting")
+        body = json.dumps({"update_id": 900, "message": {"chat": {"id": 1}}})
+        with mock.patch("bot.views.get_dispatcher", return_value=full), \
+                mock.patch("bot.views.deduplicator", UpdateDeduplicator()) as dedup:
+            response = self.client.post("/webhook/", body, content_type="application/json")
+            self.assertEqual(response.status_code, 503)
+            # Released, so Telegram's redelivery is taken rather than dropped
+            self.assertTrue(dedup.claim(900))
+        self.assertEqual(full.stats()["rejected"], 1)
+
+
+class ProfileSyncTests(TestCase):
+    def setUp(self):
+        profiles.profile_cache.clear()
+        self.addCleanup(profiles.profile_cache.clear)
+
+    def tg_user(self, first_name="Ali"):
+        return types.User(id=77, is_bot=False, first_name=first_name, username="ali", language_code="uz")
+
+    def test_unchanged_profile_is_not_written_again(self):
+        pk = profiles.sync_user(self.tg_user())
+        with self.assertNumQueries(0):
+            self.assertEqual(profiles.sync_user(self.tg_user()), pk)
+
+        profiles.sync_user(self.tg_user("Vali"))
+        self.assertEqual(TgUser.objects.get(pk=pk).first_name, "Vali")
+
+    def test_user_who_came_back_is_undeleted(self):
+        pk = profiles.sync_user(self.tg_user())
+        profiles.mark_deleted(77)  # kicked the bot
+        self.assertTrue(TgUser.objects.get(pk=pk).deleted)
+
+        # Same profile as cached before, but the row must be rewritten
+        profiles.sync_user(self.tg_user())
+        self.assertFalse(TgUser.objects.get(pk=pk).deleted)
+
+        profiles.mark_deleted_many([77])  # blocked during a broadcast
+        profiles.sync_user(self.tg_user())
+        self.assertFalse(TgUser.objects.get(pk=pk).deleted)
+
+
+class CatalogTests(TestCase):
+    def setUp(self):
+        self.category = JobCategory.objects.create(name="Ofis")
+        Menu.objects.create(key="jobs", title="Vakansiyalar")
+        catalog.invalidate()
+        self.addCleanup(catalog.invalidate)
+
+    def test_warm_catalog_runs_no_queries(self):
+        catalog.main_menu
+        with self.assertNumQueries(0):
+            self.assertIn("Vakansiyalar", catalog.main_menu)
+            self.assertEqual(catalog.menu_key("Vakansiyalar"), "jobs")
+            catalog.categories
+            catalog.locations(self.category.pk)
+            catalog.positions(self.category.pk)
+
+    def test_admin_changes_invalidate_the_catalog(self):
+        self.assertNotIn("Kassir", catalog.positions(self.category.pk))
+        position = Position.objects.create(category=self.category, title="Kassir")
+        self.assertIn("Kassir", catalog.positions(self.category.pk))
+
+        position.delete()
+        Menu.objects.filter(key="jobs").delete()
+        self.assertNotIn("Kassir", catalog.positions(self.category.pk))
+        self.assertIsNone(catalog.menu_key("Vakansiyalar"))
+
+    def test_concurrent_readers_of_a_cold_catalog_build_it_once(self):
+        cold = Catalog()
+        built = []
+
+        def build():
+            built.append(1)
+            time.sleep(0.05)
+            return {}
+
+        with mock.patch.object(cold, "_build", side_effect=build):
+            threads = [threading.Thread(target=lambda: cold.snapshot) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(len(built), 1)
+
+    @override_settings(BOT_CATALOG_TTL=0)
+    def test_other_processes_catch_up_after_the_ttl(self):
+        # A separate Catalog is not reached by this process's signals
+        other = Catalog()
+        other.categories
+        JobCategory.objects.create(name="Zavod")
+        self.assertIn("Zavod", other.categories)
+
+
+class PagePhotoTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.page = PageContent.objects.create(
+            key="about", text="Biz haqimizda", image=SimpleUploadedFile("about.jpg", b"first image"),
+        )
+        self.send_photo = self.enterContext(mock.patch.object(views.bot, "send_photo"))
+        self.send_photo.side_effect = lambda chat_id, photo, **kwargs: SimpleNamespace(
+            photo=[SimpleNamespace(file_id="small"), SimpleNamespace(file_id=f"id-{len(self.send_photo.call_args_list)}")]
+        )
+
+    def sent_photos(self):
+        return [c.args[1] for c in self.send_photo.call_args_list]
+
+    def test_uploaded_once_then_sent_by_file_id(self):
+        views.send_page_photo(1, self.page)
+        self.page.refresh_from_db()
+        self.assertEqual(self.page.telegram_file_id, "id-1")
+
+        views.send_page_photo(2, self.page)
+        self.assertEqual(self.sent_photos(), [b"first image", "id-1"])
+
+    def test_unknown_file_id_is_uploaded_again(self):
+        PageContent.objects.filter(pk=self.page.pk).update(telegram_file_id="expired")
+        self.page.refresh_from_db()
+        side_effect = self.send_photo.side_effect
+
+        def send_photo(chat_id, photo, **kwargs):
+            if photo == "expired":
+                raise ApiTelegramException("sendPhoto", None, {
+                    "error_code": 400, "description": "Bad Request: wrong file identifier",
+                })
+            return side_effect(chat_id, photo, **kwargs)
+        self.send_photo.side_effect = send_photo
+
+        views.send_page_photo(1, self.page)
+        self.assertEqual(self.sent_photos(), ["expired", b"first image"])
+        self.page.refresh_from_db()
+        self.assertEqual(self.page.telegram_file_id, "id-2")
+
+    def test_replacing_the_image_drops_the_file_id(self):
+        views.send_page_photo(1, self.page)
+        self.page.refresh_from_db()
+        self.page.image = SimpleUploadedFile("about.jpg", b"second image")
+        self.page.save()
+        self.assertEqual(self.page.telegram_file_id, "")
+
+        views.send_page_photo(2, self.page)
+        self.assertEqual(self.sent_photos(), [b"first image", b"second image"])
+
+
+class StatsAccessTests(TestCase):
+    def test_stats_need_staff_without_relying_on_the_admin_login(self):
+        for url in ("/webhook/stats/", "/exam/fragments/stats/"):
+            self.assertEqual(self.client.get(url).status_code, 403, url)
+        self.client.force_login(User.objects.create_user("xodim", is_staff=True))
+        for url in ("/webhook/stats/", "/exam/fragments/stats/"):
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        category = JobCategory.objects.create(name="Ofis")
+        location = Location.objects.create(category=category, name="Toshkent")
+        position = Position.objects.create(category=category, title="Kassir")
+        for i in range(5):
+            user = TgUser.objects.create(telegram_id=i, first_name=f"User{i}")
+            JobApplication.objects.create(
+                user=user, full_name=f"User {i}", birth_date="2000-01-01", region="Toshkent",
+                position=position, location=location if i % 2 else None, phone_number="+998901234567",
+            )
+
+    def test_rows_take_one_query(self):
+        headers, accessors = application_columns()
+        with self.assertNumQueries(1):
+            rows = list(application_rows(JobApplication.objects.all(), accessors))
+        self.assertEqual(len(rows), 5)
+        row = dict(zip(headers, rows[1]))
+        self.assertEqual((row["user"], row["position"], row["location"]), ("User1", "Kassir", "Toshkent"))
+        self.assertEqual(dict(zip(headers, rows[0]))["location"], "")
+        self.assertIsNone(row["created_at"].tzinfo)
+
+    def test_xlsx_and_csv(self):
+        response = applications_xlsx(JobApplication.objects.all())
+        ws = openpyxl.load_workbook(io.BytesIO(b"".join(response.streaming_content))).active
+        self.assertEqual(ws.max_row, 6)
+
+        response = applications_csv(JobApplication.objects.all())
+        lines = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(lines[0].startswith("id,user,full_name"))
+
+
+class ChangelistQueryTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        category = JobCategory.objects.create(name="Ofis")
+        self.location = Location.objects.create(category=category, name="Toshkent")
+        self.position = Position.objects.create(category=category, title="Kassir")
+        self.n = 0
+
+    def add_applications(self, count):
+        for _ in range(count):
+            user = TgUser.objects.create(telegram_id=self.n, first_name=f"User{self.n}")
+            JobApplication.objects.create(
+                user=user, birth_date="2000-01-01", region="Toshkent", position=self.position,
+                location=self.location, phone_number="+998901234567", comments="x" * 1000,
+            )
+            self.n += 1
+
+    def test_application_changelist(self):
+        for count in (2, 20):
+            self.add_applications(count)
+            with self.assertNumQueries(7):
+                response = self.client.get("/admin/bot/jobapplication/")
+            self.assertEqual(response.status_code, 200)
+            self.assertNotContains(response, "x" * 1000)
+
+
+class QueryPlanTests(QueryPlanTestCase):
+    def test_applications_by_status(self):
+        self.assertUsesIndex(JobApplication.objects.filter(status="new").order_by("-created_at"))
+
+    def test_applications_by_location(self):
+        self.assertUsesIndex(JobApplication.objects.filter(location_id=1).order_by("-created_at"))
+
+    def test_recent_applications_by_status(self):
+        self.assertUsesIndex(
+            JobApplication.objects.filter(status="new", created_at__gte=timezone.now()).order_by("-created_at")
+        )
+
+
+class ApplicationWizardTests(TestCase):
+    chat_id = 7100
+
+    def setUp(self):
+        category = JobCategory.objects.create(name="Ofis")
+        self.location = Location.objects.create(category=category, name="Chilonzor")
+        self.position = Position.objects.create(category=category, title="Kassir")
+        self.user = {"id": self.chat_id, "is_bot": False, "first_name": "Ali"}
+        profiles.profile_cache.clear()
+        self.addCleanup(profiles.profile_cache.clear)
+        self.sent = self.enterContext(mock.patch.object(views.bot, "send_message"))
+        self.enterContext(mock.patch.object(views.bot, "send_location"))
+        self.enterContext(mock.patch("bot.outbox.OutboxSender.deliver"))
+        # The state cache outlives the rolled-back rows of earlier tests
+        self.enterContext(mock.patch.object(
+            views.bot, "next_step_backend", state.StateHandlerBackend(state.build_store())
+        ))
+
+    def send(self, *updates):
+        for update in updates:
+            if isinstance(update, str):
+                update = message_update(0, self.user, update)
+            views.process_update(update)
+
+    def last_reply(self):
+        return self.sent.call_args.args[1]
+
+    def test_one_application_is_inserted_once_the_wizard_completes(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.send(callback_update(0, self.user, f"loc_{self.location.pk}"), "Ali Valiyev")
+            self.send("⬅️ Ortga")
+            self.assertEqual(self.last_reply(), "To‘liq ismingizni kiriting:")
+            self.send("Ali Valiyev", "01.02.1990", "Toshkent", "Yunusobod")
+            self.assertFalse(JobApplication.objects.exists())
+
+            # Typing instead of tapping shows the position keyboard again
+            self.send("Kassir")
+            self.assertEqual(self.last_reply(), "Lavozimni tanlang:")
+            self.send(callback_update(0, self.user, f"pos_{self.position.pk}"))
+            self.assertEqual(self.last_reply(), "Oldingi ish joyi:")
+            self.send("Korzinka", "+998901234567")
+
+        writes = [
+            q["sql"] for q in ctx.captured_queries
+            if "bot_jobapplication" in q["sql"] and not q["sql"].startswith("SELECT")
+        ]
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].startswith('INSERT INTO "bot_jobapplication"'))
+        app = JobApplication.objects.get()
+        self.assertEqual(
+            (app.full_name, str(app.birth_date), app.region, app.district, app.position, app.previous_job),
+            ("Ali Valiyev", "1990-02-01", "Toshkent", "Yunusobod", self.position, "Korzinka"),
+        )
+        self.assertEqual(OutboxMessage.objects.get().chat_id, self.chat_id)
+        self.assertIsNone(views.bot.next_step_backend.get_handlers(self.chat_id))
+
+    def test_back_from_the_position_keyboard_returns_to_the_district(self):
+        self.send(callback_update(0, self.user, f"loc_{self.location.pk}"), "Ali Valiyev", "01.02.1990", "Toshkent")
+        self.send("Yunusobod", "⬅️ Ortga")
+        self.assertEqual(self.last_reply(), "Tuman:")
+        self.send("Olmazor", callback_update(0, self.user, f"pos_{self.position.pk}"), "Korzinka", "+998901234567")
+        self.assertEqual(JobApplication.objects.get().district, "Olmazor")
+
+    def test_position_tap_without_a_pending_draft(self):
+        self.send(callback_update(0, self.user, f"pos_{self.position.pk}"))
+        self.assertEqual(self.last_reply(), "Ariza topilmadi. Qaytadan boshlang: /start")
+        self.assertFalse(JobApplication.objects.exists())
+
+
+answered = []
+
+
+@state.step
+def _remember_answer(message, field, strict=False):
+    answered.append((field, strict))
+
+
+@state.step
+def _ask_next(message, field):
+    answered.append((field, False))
+    views.bot.register_next_step_handler(message, _remember_answer, "next")
+
+
+class StateStoreTests(TestCase):
+    def backends(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        return {"db": state.DatabaseStateStore(), "file": state.FileStateStore(directory)}
+
+    def test_workers_sharing_a_backend_never_serve_stale_state(self):
+        for name, backend in self.backends().items():
+            with self.subTest(name):
+                first, second = state.CachedStateStore(backend), state.CachedStateStore(backend)
+                version = first.put(1, "draft", {"step": 1})
+                self.assertEqual(second.get(1, "draft"), (version, {"step": 1}))
+
+                version = first.put(1, "draft", {"step": 2}, version)
+                # second's cached copy is outdated; the version check catches it
+                self.assertEqual(second.get(1, "draft"), (version, {"step": 2}))
+                with self.assertRaises(state.StateConflict):
+                    second.put(1, "draft", {"step": 3}, version - 1)
+                with self.assertRaises(state.StateConflict):
+                    second.put(1, "draft", {"step": 3})
+
+    def test_only_one_worker_wins_a_pop(self):
+        for name, backend in self.backends().items():
+            with self.subTest(name):
+                first, second = state.CachedStateStore(backend), state.CachedStateStore(backend)
+                version = first.put(2, "step", ["x"])
+                self.assertIsNotNone(second.get(2, "step"))  # both workers have it cached
+                self.assertEqual(first.pop(2, "step"), (version, ["x"]))
+                self.assertIsNone(second.pop(2, "step"))
+
+    def test_concurrent_pops_of_a_file_store(self):
+        backend = self.backends()["file"]
+        backend.put(3, "step", ["x"])
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(backend.pop(3, "step"))) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(sum(r is not None for r in results), 1)
+
+    def test_next_step_handler_round_trip_between_workers(self):
+        backend = self.backends()["file"]
+        registering = state.StateHandlerBackend(state.CachedStateStore(backend))
+        handling = state.StateHandlerBackend(state.CachedStateStore(backend))
+
+        registering.register_handler(5, Handler(_remember_answer, "phone", strict=True))
+        # Registered again before the first ran: the conflict is retried and both are kept
+        registering.register_handler(5, Handler(_remember_answer, "name"))
+
+        answered.clear()
+        for handler in handling.get_handlers(5):
+            handler.callback(None, *handler.args, **handler.kwargs)
+        self.assertEqual(answered, [("phone", True), ("name", False)])
+        # Both steps ran and registered nothing, so no worker runs them again
+        self.assertIsNone(registering.get_handlers(5))
+
+    def test_a_step_hands_over_with_one_update(self):
+        backend = state.StateHandlerBackend(state.CachedStateStore(state.DatabaseStateStore()))
+        message = SimpleNamespace(chat=SimpleNamespace(id=6))
+        backend.register_handler(6, Handler(_ask_next, "name"))
+
+        answered.clear()
+        with mock.patch.object(views.bot, "next_step_backend", backend), \
+                CaptureQueriesContext(connection) as ctx:
+            for handler in backend.get_handlers(6):
+                handler.callback(message, *handler.args, **handler.kwargs)
+        self.assertEqual(answered, [("name", False)])
+        writes = [q["sql"].split()[0] for q in ctx.captured_queries if not q["sql"].startswith("SELECT")]
+        self.assertEqual(writes, ["UPDATE"])
+        self.assertEqual(ConversationState.objects.get(chat_id=6).data[0]["args"], ["next"])
+
+    def test_only_one_worker_runs_its_successor(self):
+        backend = self.backends()["file"]
+        first = state.StateHandlerBackend(state.CachedStateStore(backend))
+        second = state.StateHandlerBackend(state.CachedStateStore(backend))
+        message = SimpleNamespace(chat=SimpleNamespace(id=7))
+        first.register_handler(7, Handler(_ask_next, "name"))
+
+        racing = [first.get_handlers(7), second.get_handlers(7)]
+        for worker, handlers in zip([first, second], racing):
+            with mock.patch.object(views.bot, "next_step_backend", worker):
+                for handler in handlers:
+                    handler.callback(message, *handler.args, **handler.kwargs)
+        version, handlers = backend.get(7, "step")
+        self.assertEqual([h["args"] for h in handlers], [["next"]])
+
+    def test_absent_state_is_cached_until_written(self):
+        store = state.CachedStateStore(state.DatabaseStateStore())
+        self.assertIsNone(store.get(8, "step"))
+        with self.assertNumQueries(0):
+            self.assertIsNone(store.get(8, "step"))
+        version = store.put(8, "step", ["x"])
+        self.assertEqual(store.get(8, "step"), (version, ["x"]))
+
+    def test_unregistered_callback_is_refused(self):
+        backend = state.StateHandlerBackend(state.MemoryStateStore())
+        with self.assertRaises(ValueError):
+            backend.register_handler(1, Handler(lambda message: None))
@@ -1,68 +1,101 @@
+import hashlib
 import json
+import threading
 import traceback
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import telebot
-from telebot import TeleBot, types
+from telebot import TeleBot, apihelper, types
+from telebot.apihelper import ApiTelegramException
 from telebot.types import ReplyKeyboardRemove
 from datetime import datetime
 
-from conf.settings import HOST, TELEGRAM_BOT_TOKEN
-
-from .models import (
-    TgUser, Menu, JobCategory, Location, Position, JobApplication, PageContent
+from conf.decorators import staff_required
+from conf.settings import TELEGRAM_BOT_TOKEN
+
+from . import outbox, profiles, state
+from .catalog import catalog
+from .dedup import deduplicator, extract_update_id
+from .dispatcher import UpdateDispatcher, update_chat_id
+from .drafts import clean_field
+from .models import JobApplication, PageContent
+from .outbound import get_client
+
+# Every TeleBot call goes through the pooled, rate-limited client
+apihelper.API_URL = settings.TELEGRAM_API_URL.rstrip("/") + "/bot{0}/{1}"
+apihelper.CUSTOM_REQUEST_SENDER = get_client().request
+
+bot = TeleBot(
+    TELEGRAM_BOT_TOKEN,
+    threaded=False,
+    next_step_backend=state.build_handler_backend(),
 )
 
-bot = TeleBot(TELEGRAM_BOT_TOKEN, threaded=False)
-
 def back_button():
     kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
     kb.row("⬅️ Ortga")
     return kb
 
 
+def process_update(update_json):
+    update = telebot.types.Update.de_json(update_json)
+
+    if update.message:
+        profiles.sync_user(update.message.from_user)
+
+    member = update.my_chat_member
+    if member:
+        if member.new_chat_member.status == 'kicked':
+            profiles.mark_deleted(member.from_user.id)
+        elif member.new_chat_member.status == 'member':
+            # User unblocked the bot; a cached profile would hide the change
+            profiles.profile_cache.discard(member.from_user.id)
+            profiles.sync_user(member.from_user)
+
+    bot.process_new_updates([update])
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                dispatcher = UpdateDispatcher(
+                    process_update,
+                    workers=settings.BOT_UPDATE_WORKERS,
+                    maxsize=settings.BOT_UPDATE_QUEUE_SIZE,
+                )
+                dispatcher.start()
+                _dispatcher = dispatcher
+    return _dispatcher
+
+
 @csrf_exempt
 def telegram_webhook(request):
     try:
         if request.method == 'POST':
-            update_data = request.body.decode('utf-8')
-            update_json = json.loads(update_data)
-            update = telebot.types.Update.de_json(update_json)
-
-            if update.message:
-                tg_user = update.message.from_user
-                telegram_id = tg_user.id
-                first_name = tg_user.first_name
-                last_name = tg_user.last_name
-                username = tg_user.username
-                is_bot = tg_user.is_bot
-                language_code = tg_user.language_code
-
-                deleted = False
-
-                tg_user_instance, _ = TgUser.objects.update_or_create(
-                    telegram_id=telegram_id,
-                    defaults={
-                        'first_name': first_name,
-                        'last_name': last_name,
-                        'username': username,
-                        'is_bot': is_bot,
-                        'language_code': language_code,
-                        'deleted': deleted,
-                    }
-                )
-
-            try:
-                if update.my_chat_member.new_chat_member.status == 'kicked':
-                    telegram_id = update.my_chat_member.from_user.id
-                    user = TgUser.objects.get(telegram_id=telegram_id)
-                    user.deleted = True
-                    user.save()
-            except:
-                pass
-
-            bot.process_new_updates(
-                [telebot.types.Update.de_json(request.body.decode("utf-8"))])
+            update_id = extract_update_id(request.body)
+            if update_id is not None and not deduplicator.claim(update_id):
+                # Redelivery of an update we already took
+                return HttpResponse("ok")
+
+            update_json = json.loads(request.body.decode('utf-8'))
+
+            if settings.BOT_UPDATE_MODE == 'queue':
+                if not isinstance(update_json, dict) or 'update_id' not in update_json:
+                    return HttpResponse("bad update", status=400)
+                if not get_dispatcher().submit(update_chat_id(update_json), update_json):
+                    # Non-2xx makes Telegram redeliver once we have caught up
+                    deduplicator.release(update_id)
+                    return HttpResponse("busy", status=503)
+            else:
+                process_update(update_json)
 
         return HttpResponse("ok")
     except Exception as e:
@@ -70,29 +103,20 @@ def telegram_webhook(request):
         return HttpResponse("error")
 
 
-@bot.message_handler(commands=['start'])
-def send_main_menu(message):
-    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
+@staff_required
+def webhook_stats(request):
+    stats = {"mode": settings.BOT_UPDATE_MODE, "dedup": deduplicator.stats()}
+    if _dispatcher is None:
+        return JsonResponse({**stats, "running": False})
+    return JsonResponse({**stats, "running": True, **_dispatcher.stats()})
 
-    # Fetch all menus
-    menus = list(Menu.objects.all())
-
-    # Add buttons 2 per row
-    row = []
-    for i, menu in enumerate(menus, start=1):
-        row.append(types.KeyboardButton(menu.title))
-        if i % 2 == 0:  # every 2 buttons, add row to keyboard
-            kb.row(*row)
-            row = []
-
-    # Add remaining button if odd number of menus
-    if row:
-        kb.row(*row)
 
+@bot.message_handler(commands=['start'])
+def send_main_menu(message):
     bot.send_message(
         message.chat.id,
         "Assalomu alaykum! Menyudan tanlang:",
-        reply_markup=kb
+        reply_markup=catalog.main_menu
     )
 
 
@@ -101,21 +125,20 @@ def menu_router(message):
     text = message.text
 
     # 🔍 Menu title bo‘yicha aniqlaymiz
-    try:
-        menu = Menu.objects.get(title=text)
-    except Menu.DoesNotExist:
+    key = catalog.menu_key(text)
+    if key is None:
         return bot.send_message(message.chat.id, "Menyudan tanlang.")
 
     # === ABOUT ===
-    if menu.key == "about":
+    if key == "about":
         return send_page_content(message.chat.id, "about")
 
     # === CONTACT ===
-    if menu.key == "contact":
+    if key == "contact":
         return send_page_content(message.chat.id, "contact")
 
     # === JOBS ===
-    if menu.key == "jobs":
+    if key == "jobs":
         return send_job_categories(message)
 
 
@@ -124,12 +147,7 @@ def send_page_content(chat_id, key):
         page = PageContent.objects.get(key=key)
         if page.image:
             # Send image with caption, allow HTML formatting
-            bot.send_photo(
-                chat_id,
-                page.image.open(),
-                caption=page.text,
-                parse_mode="HTML"  # enables rich formatting
-            )
+            send_page_photo(chat_id, page)
         else:
             # Send plain text with HTML formatting (links, emojis, bold, etc.)
             bot.send_message(
@@ -142,27 +160,32 @@ def send_page_content(chat_id, key):
         bot.send_message(chat_id, "Ma'lumot topilmadi.")
 
 
+def send_page_photo(chat_id, page):
+    if page.telegram_file_id:
+        try:
+            return bot.send_photo(chat_id, page.telegram_file_id, caption=page.text, parse_mode="HTML")
+        except ApiTelegramException as e:
+            if e.error_code != 400:
+                raise
+            # Telegram no longer knows this file_id; upload again below
+
+    with page.image.open("rb") as fh:
+        data = fh.read()
+    sent = bot.send_photo(chat_id, data, caption=page.text, parse_mode="HTML")
+
+    # Keyed on the image name so a concurrent admin upload is not overwritten
+    PageContent.objects.filter(pk=page.pk, image=page.image.name).update(
+        telegram_file_id=sent.photo[-1].file_id,
+        image_hash=hashlib.sha256(data).hexdigest(),
+    )
+    return sent
+
 
 # ================================
 #  Step 1 — Show job categories
 # ================================
 def send_job_categories(message):
-    kb = types.InlineKeyboardMarkup()
-    categories = list(JobCategory.objects.all())
-
-    row = []
-    for i, cat in enumerate(categories, start=1):
-        row.append(types.InlineKeyboardButton(
-            f"{cat.icon or ''} {cat.name}",
-            callback_data=f"cat_{cat.id}"
-        ))
-        if i % 2 == 0:  # 2 buttons per row
-            kb.row(*row)
-            row = []
-    if row:  # remaining button if odd
-        kb.row(*row)
-
-    bot.send_message(message.chat.id, "Bo‘limni tanlang:", reply_markup=kb)
+    bot.send_message(message.chat.id, "Bo‘limni tanlang:", reply_markup=catalog.categories)
 
 
 # ================================
@@ -170,97 +193,69 @@ def send_job_categories(message):
 # ================================
 @bot.callback_query_handler(func=lambda call: call.data.startswith("cat_"))
 def show_locations(call):
-    cat_id = call.data.split("_")[1]
-    kb = types.InlineKeyboardMarkup()
-    locations = list(Location.objects.filter(category_id=cat_id))
-
-    row = []
-    for i, loc in enumerate(locations, start=1):
-        row.append(types.InlineKeyboardButton(
-            loc.name, callback_data=f"loc_{loc.id}"
-        ))
-        if i % 2 == 0:
-            kb.row(*row)
-            row = []
-    if row:
-        kb.row(*row)
-
-    # ⬅️ ADD INLINE BACK BUTTON
-    kb.row(types.InlineKeyboardButton("⬅️ Ortga", callback_data=f"back_cat"))
+    cat_id = int(call.data.split("_")[1])
 
     bot.edit_message_text(
         "Joyni tanlang:",
         call.message.chat.id,
         call.message.message_id,
-        reply_markup=kb
+        reply_markup=catalog.locations(cat_id)
     )
 
 @bot.callback_query_handler(func=lambda call: call.data == "back_cat")
 def back_to_categories(call):
-    kb = types.InlineKeyboardMarkup()
-    categories = list(JobCategory.objects.all())
-
-    row = []
-    for i, cat in enumerate(categories, start=1):
-        row.append(types.InlineKeyboardButton(
-            f"{cat.icon or ''} {cat.name}",
-            callback_data=f"cat_{cat.id}"
-        ))
-        if i % 2 == 0:
-            kb.row(*row)
-            row = []
-    if row:
-        kb.row(*row)
-
     bot.edit_message_text(
         "Bo‘limni tanlang:",
         chat_id=call.message.chat.id,
         message_id=call.message.message_id,
-        reply_markup=kb
+        reply_markup=catalog.categories
     )
 
 
 # ================================
-#  Step 3 — Create JobApplication
+#  Step 3 — Start JobApplication draft
 # ================================
 @bot.callback_query_handler(func=lambda call: call.data.startswith("loc_"))
 def start_application(call):
-    loc_id = call.data.split("_")[1]
-    location = Location.objects.get(id=loc_id)
-    user = TgUser.objects.get(telegram_id=call.from_user.id)
+    loc_id = int(call.data.split("_")[1])
+    location = catalog.location_info(loc_id)
+    if location is None:
+        return bot.send_message(call.message.chat.id, "Joy topilmadi.")
+    category_id, latitude, longitude = location
+    user_id = profiles.sync_user(call.from_user)
 
     # Hide main keyboard
     bot.send_message(call.message.chat.id, "Ariza boshlanmoqda...", reply_markup=ReplyKeyboardRemove())
 
     # Send location if exists
-    if location.latitude and location.longitude:
-        bot.send_location(call.message.chat.id, latitude=location.latitude, longitude=location.longitude)
-
-    # Create empty application
-    application = JobApplication.objects.create(
-        user=user,
-        location=location,
-        birth_date="2000-01-01",
-        region="",
-        phone_number="-",
-        full_name=""
-    )
+    if latitude and longitude:
+        bot.send_location(call.message.chat.id, latitude=latitude, longitude=longitude)
+
+    # Nothing is written until step_phone; the draft travels with the steps
+    draft = {
+        "user_id": user_id,
+        "location_id": loc_id,
+        "category_id": category_id,
+    }
 
     # Ask full name
     bot.send_message(call.message.chat.id, "To‘liq ismingizni kiriting:", reply_markup=back_button())
-    bot.register_next_step_handler(call.message, step_full_name, application.id)
+    bot.register_next_step_handler(call.message, step_full_name, draft)
 
-def step_full_name(message, app_id):
+@state.step
+def step_full_name(message, draft):
     if message.text == "⬅️ Ortga":
-        JobApplication.objects.filter(id=app_id).delete()
         return send_main_menu(message)
 
-    app = JobApplication.objects.get(id=app_id)
-    app.full_name = message.text.strip()
-    app.save()
+    full_name = clean_field("full_name", (message.text or "").strip())
+    if not full_name:
+        bot.send_message(message.chat.id, "To‘liq ismingizni kiriting:", reply_markup=back_button())
+        return bot.register_next_step_handler(message, step_full_name, draft)
+
+    draft = {**draft, "full_name": full_name}
 
     bot.send_message(message.chat.id, "Tug‘ilgan sana (DD.MM.YYYY):", reply_markup=back_button())
-    bot.register_next_step_handler(message, step_birth_date, app_id)
+    bot.register_next_step_handler(message, step_birth_date, draft)
 
 
 # ================================
@@ -276,117 +271,133 @@ def parse_date(date_text):
             continue
     return None
 
-def step_birth_date(message, app_id):
+@state.step
+def step_birth_date(message, draft):
     if message.text == "⬅️ Ortga":
         bot.send_message(message.chat.id, "To‘liq ismingizni kiriting:", reply_markup=back_button())
-        return bot.register_next_step_handler(message, step_full_name, app_id)
+        return bot.register_next_step_handler(message, step_full_name, draft)
 
-    app = JobApplication.objects.get(id=app_id)
-    date_val = parse_date(message.text)
+    date_val = parse_date(message.text or "")
     if not date_val:
         bot.send_message(message.chat.id, "Noto‘g‘ri format!")
-        return bot.register_next_step_handler(message, step_birth_date, app_id)
+        return bot.register_next_step_handler(message, step_birth_date, draft)
 
-    app.birth_date = date_val
-    app.save()
+    draft = {**draft, "birth_date": date_val.isoformat()}
 
     bot.send_message(message.chat.id, "Viloyat:", reply_markup=back_button())
-    bot.register_next_step_handler(message, step_region, app_id)
+    bot.register_next_step_handler(message, step_region, draft)
 
 
-def step_region(message, app_id):
+@state.step
+def step_region(message, draft):
     if message.text == "⬅️ Ortga":
         bot.send_message(message.chat.id, "Tug‘ilgan sana:", reply_markup=back_button())
-        return bot.register_next_step_handler(message, step_birth_date, app_id)
+        return bot.register_next_step_handler(message, step_birth_date, draft)
+
+    region = clean_field("region", message.text)
+    if not region:
+        bot.send_message(message.chat.id, "Viloyat:", reply_markup=back_button())
+        return bot.register_next_step_handler(message, step_region, draft)
 
-    app = JobApplication.objects.get(id=app_id)
-    app.region = message.text
-    app.save()
+    draft = {**draft, "region": region}
 
     bot.send_message(message.chat.id, "Tuman:", reply_markup=back_button())
-    bot.register_next_step_handler(message, step_district, app_id)
+    bot.register_next_step_handler(message, step_district, draft)
 
 
-def step_district(message, app_id):
+@state.step
+def step_district(message, draft):
     if message.text == "⬅️ Ortga":
         bot.send_message(message.chat.id, "Viloyat:", reply_markup=back_button())
-        return bot.register_next_step_handler(message, step_region, app_id)
-
-    app = JobApplication.objects.get(id=app_id)
-    app.district = message.text
-    app.save()
+        return bot.register_next_step_handler(message, step_region, draft)
 
-    kb = types.InlineKeyboardMarkup()
-    positions = list(Position.objects.filter(category=app.location.category))
+    district = clean_field("district", message.text)
+    if not district:
+        bot.send_message(message.chat.id, "Tuman:", reply_markup=back_button())
+        return bot.register_next_step_handler(message, step_district, draft)
 
-    row = []
-    for i, pos in enumerate(positions, start=1):
-        row.append(types.InlineKeyboardButton(
-            pos.title, callback_data=f"pos_{pos.id}_{app_id}"
-        ))
-        if i % 2 == 0:
-            kb.row(*row)
-            row = []
-    if row:
-        kb.row(*row)
+    draft = {**draft, "district": district}
 
-    bot.send_message(message.chat.id, "Lavozimni tanlang:", reply_markup=kb)
+    bot.send_message(message.chat.id, "Lavozimni tanlang:", reply_markup=catalog.positions(draft["category_id"]))
+    bot.register_next_step_handler(message, step_position, draft)
 
 
 # ================================
 #  Position selection
 # ================================
+@state.step
+def step_position(message, draft, position_id=None):
+    # Typed text instead of a tap on the inline keyboard
+    if position_id is None:
+        if message.text == "⬅️ Ortga":
+            bot.send_message(message.chat.id, "Tuman:", reply_markup=back_button())
+            return bot.register_next_step_handler(message, step_district, draft)
+        bot.send_message(message.chat.id, "Lavozimni tanlang:", reply_markup=catalog.positions(draft["category_id"]))
+        return bot.register_next_step_handler(message, step_position, draft)
+
+    draft = {**draft, "position_id": position_id}
+
+    bot.send_message(message.chat.id, "Oldingi ish joyi:")
+    bot.register_next_step_handler(message, step_prev_job, draft)
+
+
 @bot.callback_query_handler(func=lambda call: call.data.startswith("pos_"))
 def select_position(call):
-    _, pos_id, app_id = call.data.split("_")
+    pos_id = int(call.data.split("_")[1])
 
-    app = JobApplication.objects.get(id=app_id)
-    app.position_id = pos_id
-    app.save()
+    # The draft waits in the pending step; resuming it claims that step
+    resumed = bot.next_step_backend.resume(call.message.chat.id, step_position, call.message, position_id=pos_id)
+    if not resumed:
+        return bot.send_message(call.message.chat.id, "Ariza topilmadi. Qaytadan boshlang: /start")
 
-    bot.send_message(call.message.chat.id, "Oldingi ish joyi:")
-    bot.register_next_step_handler(call.message, step_prev_job, app_id)
 
-
-def step_prev_job(message, app_id):
+@state.step
+def step_prev_job(message, draft):
     if message.text == "⬅️ Ortga":
         bot.send_message(message.chat.id, "Tuman:", reply_markup=back_button())
-        return bot.register_next_step_handler(message, step_district, app_id)
+        return bot.register_next_step_handler(message, step_district, draft)
+
+    previous_job = clean_field("previous_job", message.text)
+    if not previous_job:
+        bot.send_message(message.chat.id, "Oldingi ish joyi:")
+        return bot.register_next_step_handler(message, step_prev_job, draft)
 
-    app = JobApplication.objects.get(id=app_id)
-    app.previous_job = message.text
-    app.save()
+    draft = {**draft, "previous_job": previous_job}
 
     bot.send_message(message.chat.id, "Telefon raqam:")
-    bot.register_next_step_handler(message, step_phone, app_id)
+    bot.register_next_step_handler(message, step_phone, draft)
 
 
-def step_phone(message, app_id):
+@state.step
+def step_phone(message, draft):
     if message.text == "⬅️ Ortga":
         bot.send_message(message.chat.id, "Oldingi ish joyi:", reply_markup=back_button())
-        return bot.register_next_step_handler(message, step_prev_job, app_id)
-
-    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
-
-    # Fetch all menus
-    menus = list(Menu.objects.all())
-
-    # Add buttons 2 per row
-    row = []
-    for i, menu in enumerate(menus, start=1):
-        row.append(types.KeyboardButton(menu.title))
-        if i % 2 == 0:  # every 2 buttons, add row to keyboard
-            kb.row(*row)
-            row = []
-
-    # Add remaining button if odd number of menus
-    if row:
-        kb.row(*row)
-    app = JobApplication.objects.get(id=app_id)
-    app.phone_number = message.text
-    app.save()
-
-    bot.send_message(message.chat.id, "Ariza qabul qilindi. Rahmat!", reply_markup=kb)
-
-
-bot.set_webhook(url="https://" + HOST + "/webhook/")
\ No newline at end of file
+        return bot.register_next_step_handler(message, step_prev_job, draft)
+
+    phone_number = clean_field("phone_number", message.text)
+    if not phone_number:
+        bot.send_message(message.chat.id, "Telefon raqam:")
+        return bot.register_next_step_handler(message, step_phone, draft)
+
+    app = JobApplication(
+        user_id=draft["user_id"],
+        location_id=draft["location_id"],
+        position_id=draft.get("position_id"),
+        full_name=draft["full_name"],
+        birth_date=draft["birth_date"],
+        region=draft["region"],
+        district=draft.get("district"),
+        previous_job=draft.get("previous_job"),
+        phone_number=phone_number,
+    )
+    # FK ids come from our own lookups, so skip their existence queries
+    app.clean_fields(exclude=["user", "location", "position"])
+    with transaction.atomic():
+        app.save(force_insert=True)
+        # Recorded with the application, so the confirmation survives an outage
+        outbox.enqueue(
+            "sendMessage",
+            message.chat.id,
+            text="Ariza qabul qilindi. Rahmat!",
+            reply_markup=json.loads(catalog.main_menu),
+        )
@@ -0,0 +1,70 @@
+import fcntl
+import hashlib
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+
+from .outbound import TelegramError, get_client
+
+logger = logging.getLogger(__name__)
+
+
+def desired_webhook():
+    desired = {"url": "https://" + settings.HOST + "/webhook/"}
+    if settings.BOT_WEBHOOK_MAX_CONNECTIONS:
+        desired["max_connections"] = settings.BOT_WEBHOOK_MAX_CONNECTIONS
+    if settings.BOT_WEBHOOK_ALLOWED_UPDATES:
+        desired["allowed_updates"] = settings.BOT_WEBHOOK_ALLOWED_UPDATES
+    return desired
+
+
+def webhook_differs(info, desired):
+    for key, value in desired.items():
+        current = info.get(key)
+        if key == "allowed_updates":
+            current, value = sorted(current or []), sorted(value)
+        if current != value:
+            return True
+    return False
+
+
+def _lock_path():
+    token_hash = hashlib.sha256(settings.TELEGRAM_BOT_TOKEN.encode()).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"bot-webhook-{token_hash}.lock")
+
+
+def ensure_webhook(client=None, force=False):
+    """
+    Call setWebhook only when getWebhookInfo disagrees with our settings.
+
+    An flock makes sure only one process on the host talks to Telegram;
+    the others return "locked" straight away. Returns "unchanged", "updated"
+    or "locked".
+    """
+    client = client or get_client()
+    fd = os.open(_lock_path(), os.O_CREAT | os.O_RDWR, 0o600)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return "locked"
+
+        desired = desired_webhook()
+        info = client.call("getWebhookInfo", {})
+        if not force and not webhook_differs(info, desired):
+            return "unchanged"
+
+        client.call("setWebhook", desired)
+        logger.info("Webhook set to %s", desired["url"])
+        return "updated"
+    finally:
+        os.close(fd)
+
+
+def ensure_webhook_quietly():
+    try:
+        ensure_webhook()
+    except TelegramError:
+        logger.exception("Could not sync the Telegram webhook")
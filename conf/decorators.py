@@ -0,0 +1,17 @@
+from functools import wraps
+
+from django.http import HttpResponseForbidden
+
+
+def staff_required(view):
+    """
+    staff_member_required for views served outside the admin: refuses with
+    403 instead of redirecting to admin:login, which "bot" and "exam"
+    processes do not mount (DEPLOYMENT_ROLE).
+    """
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if not (request.user.is_active and request.user.is_staff):
+            return HttpResponseForbidden("Faqat xodimlar uchun")
+        return view(request, *args, **kwargs)
+    return wrapped
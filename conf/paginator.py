@@ -0,0 +1,28 @@
+from django.core.paginator import Paginator
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for large admin changelists that never runs an unbounded COUNT(*).
+
+    Up to `exact_limit` rows are counted exactly (COUNT over a LIMITed
+    subquery). Past that, an unfiltered table is estimated from its highest
+    id and a filtered one is reported as `exact_limit` rows, so only the
+    first pages are reachable by number; filters narrow the rest down.
+    """
+
+    exact_limit = 10000
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if not hasattr(qs, "query"):
+            return super().count
+        n = qs[: self.exact_limit + 1].count()
+        if n <= self.exact_limit:
+            return n
+        if not qs.query.where:
+            return qs.model._default_manager.aggregate(n=Max("pk"))["n"] or n
+        return self.exact_limit
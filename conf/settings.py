@@ -21,9 +21,56 @@ TELEGRAM_BOT_TOKEN = env.str('TELEGRAM_BOT_TOKEN')
 
 HOST = env.str('HOST')
 
+# Which URLs this process serves: "all", "exam", "bot" or "admin"
+DEPLOYMENT_ROLE = env.str('DEPLOYMENT_ROLE', 'all')
+
+# Bot API base URL; point it at a local fake server in tests
+TELEGRAM_API_URL = env.str('TELEGRAM_API_URL', 'https://api.telegram.org')
+TELEGRAM_POOL_SIZE = env.int('TELEGRAM_POOL_SIZE', 10)
+
+# Webhook registration runs via `manage.py sync_webhook`, or in the
+# background at startup when BOT_WEBHOOK_ON_STARTUP is set.
+BOT_WEBHOOK_ON_STARTUP = env.bool('BOT_WEBHOOK_ON_STARTUP', False)
+BOT_WEBHOOK_MAX_CONNECTIONS = env.int('BOT_WEBHOOK_MAX_CONNECTIONS', None)
+BOT_WEBHOOK_ALLOWED_UPDATES = env.list('BOT_WEBHOOK_ALLOWED_UPDATES', [])
+
+# "sync" handles updates inside the webhook request, "queue" hands them to
+# a bounded in-process worker pool and answers Telegram immediately.
+BOT_UPDATE_MODE = env.str('BOT_UPDATE_MODE', 'sync')
+BOT_UPDATE_WORKERS = env.int('BOT_UPDATE_WORKERS', 4)
+BOT_UPDATE_QUEUE_SIZE = env.int('BOT_UPDATE_QUEUE_SIZE', 1000)
+# Recent update_ids remembered to drop Telegram's redeliveries.
+BOT_DEDUP_WINDOW = env.int('BOT_DEDUP_WINDOW', 10000)
+# Seconds between writes of the shared update_id mark and re-reads of it;
+# duplicates are answered from memory in between.
+BOT_DEDUP_FLUSH_INTERVAL = env.float('BOT_DEDUP_FLUSH_INTERVAL', 5.0)
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Where the application wizard keeps next-step state: "db" and "file" are
+# shared by all worker processes, "memory" is single-process only.
+BOT_STATE_BACKEND = env.str('BOT_STATE_BACKEND', 'db')
+BOT_STATE_DIR = env.str('BOT_STATE_DIR', str(BASE_DIR / '.bot-state'))
+BOT_STATE_CACHE_SIZE = env.int('BOT_STATE_CACHE_SIZE', 5000)
+# Seconds a worker trusts that a chat has no state before asking again.
+BOT_STATE_NEGATIVE_TTL = env.float('BOT_STATE_NEGATIVE_TTL', 2.0)
+
+# Telegram allows about 30 messages/s per bot. Every process on a host books
+# its sends in TELEGRAM_RATE_FILE so they share that budget; set it to ""
+# to limit each process on its own. With several hosts, divide the rate
+# between them.
+TELEGRAM_GLOBAL_RATE = env.float('TELEGRAM_GLOBAL_RATE', 30.0)
+TELEGRAM_RATE_FILE = env.str('TELEGRAM_RATE_FILE', str(Path(BOT_STATE_DIR) / 'telegram-rate'))
+
+# Seconds a worker may serve prebuilt keyboards before re-reading the menus;
+# changes made in the same process invalidate them immediately via signals.
+BOT_CATALOG_TTL = env.int('BOT_CATALOG_TTL', 60)
+
+# Seconds after an exam's deadline that autosaved answers are still taken,
+# for batches the browser sent just before the timer ran out.
+EXAM_AUTOSAVE_GRACE = env.int('EXAM_AUTOSAVE_GRACE', 30)
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -47,7 +94,8 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'exam',
-    'bot'
+    'bot',
+    'reports',
 ]
 
 MIDDLEWARE = [
@@ -88,10 +136,33 @@ WSGI_APPLICATION = 'conf.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': env.str('SQLITE_PATH', str(BASE_DIR / 'db.sqlite3')),
     }
 }
 
+# SQLite tuned for concurrent writers: WAL lets readers run alongside the
+# single writer, IMMEDIATE transactions take the write lock up front (so a
+# waiting writer honours the busy timeout instead of failing on upgrade),
+# and synchronous=NORMAL is durable under WAL except on power loss.
+SQLITE_PRODUCTION = env.bool('SQLITE_PRODUCTION', False)
+SQLITE_BUSY_TIMEOUT = env.int('SQLITE_BUSY_TIMEOUT', 20)  # seconds
+SQLITE_CACHE_SIZE_KB = env.int('SQLITE_CACHE_SIZE_KB', 20000)
+SQLITE_MMAP_SIZE = env.int('SQLITE_MMAP_SIZE', 128 * 1024 * 1024)
+
+if SQLITE_PRODUCTION:
+    DATABASES['default']['OPTIONS'] = {
+        'init_command': (
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'
+            f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT * 1000};'
+            f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB};'
+            f'PRAGMA mmap_size={SQLITE_MMAP_SIZE};'
+            'PRAGMA temp_store=MEMORY;'
+        ),
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': SQLITE_BUSY_TIMEOUT,
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
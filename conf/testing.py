@@ -0,0 +1,33 @@
+import re
+
+from django.db import connection
+from django.test import TestCase
+
+# "SCAN t" reads the whole table; "SCAN t USING [COVERING] INDEX" walks an
+# index and "SEARCH t USING ..." seeks into one.
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+def query_plan(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+class QueryPlanTestCase(TestCase):
+    """Fails a hot lookup whose SQLite plan falls back to a full table scan."""
+
+    @classmethod
+    def setUpClass(cls):
+        if connection.vendor != "sqlite":
+            cls.__unittest_skip__ = True
+            cls.__unittest_skip_why__ = "EXPLAIN QUERY PLAN is SQLite specific"
+        super().setUpClass()
+
+    def assertUsesIndex(self, queryset):
+        plan = query_plan(queryset)
+        scans = [step for step in plan if FULL_SCAN.match(step)]
+        self.assertFalse(scans, f"Full table scan in {plan}")
+        self.assertNotIn("USE TEMP B-TREE FOR ORDER BY", plan, f"Sort without index in {plan}")
+        return plan
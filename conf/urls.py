@@ -4,17 +4,34 @@ from django.urls import path, include
 from django.conf.urls.static import static
 from django.http import HttpResponse
 
-from bot.views import telegram_webhook
+from bot import entry as bot_entry
 
 def home(request):
     return HttpResponse("hello world")
 
+# DEPLOYMENT_ROLE decides which parts a process serves: "exam", "bot",
+# "admin" or "all". The bot stack itself is only imported on the first webhook.
+role = settings.DEPLOYMENT_ROLE
+
 urlpatterns = [
     path('', home),
-    path("admin/", admin.site.urls),
-    path("exam/", include("exam.urls")),   # 👈 add this
-    path('webhook/', telegram_webhook, name='telegram_webhook')
 ]
 
+if role in ("all", "admin"):
+    urlpatterns += [
+        path("admin/", admin.site.urls),
+        path("reports/", include("reports.urls")),
+    ]
+
+# The admin links to exam registration pages, so it needs their URL names
+if role in ("all", "exam", "admin"):
+    urlpatterns.append(path("exam/", include("exam.urls")))   # 👈 add this
+
+if role in ("all", "bot"):
+    urlpatterns += [
+        path('webhook/', bot_entry.telegram_webhook, name='telegram_webhook'),
+        path('webhook/stats/', bot_entry.webhook_stats, name='webhook_stats'),
+    ]
+
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
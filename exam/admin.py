@@ -3,9 +3,11 @@ from .models import Exam, Question, Choice, Candidate, Attempt, Answer
 from django.utils.html import format_html
 from django.conf import settings
 from django.urls import reverse
-import openpyxl
-from openpyxl.styles import PatternFill
-from django.http import HttpResponse
+from conf.paginator import EstimatedCountPaginator
+from reports.actions import background_export
+from . import grading
+from .exports import attempts_xlsx
+from .forms import CandidateAdminForm
 
 
 class ChoiceInline(admin.TabularInline):
@@ -20,11 +22,24 @@ class SavolAdmin(admin.ModelAdmin):
     search_fields = ("text",)
     inlines = [ChoiceInline]
 
+    def get_queryset(self, request):
+        # __str__ shows the exam title, also in autocomplete results
+        return super().get_queryset(request).select_related("exam")
+
+
+@admin.register(Choice)
+class VariantAdmin(admin.ModelAdmin):
+    list_display = ("text", "question", "is_correct")
+    list_select_related = ("question__exam",)
+    search_fields = ("text",)
+    autocomplete_fields = ("question",)
+
 
 @admin.register(Exam)
 class ImtihonAdmin(admin.ModelAdmin):
     list_display = ("title", "duration_minutes", "shuffle_questions", "registration_link")
     search_fields = ("title",)
+    actions = ["regrade_attempts"]
 
     def registration_link(self, obj):
         url = reverse("register_exam", args=[obj.id])
@@ -32,16 +47,19 @@ class ImtihonAdmin(admin.ModelAdmin):
 
     registration_link.short_description = "Ro‘yxatga olish havolasi"
 
+    def regrade_attempts(self, request, queryset):
+        changed = sum(grading.regrade(exam) for exam in queryset)
+        self.message_user(request, f"Qayta baholandi, {changed} ta urinish bali o‘zgardi")
+
+    regrade_attempts.short_description = "Urinishlarni joriy javoblar bo‘yicha qayta baholash"
+
 
 @admin.register(Candidate)
 class NomzodAdmin(admin.ModelAdmin):
+    form = CandidateAdminForm
     list_display = ("full_name", "phone", "region", "work_position", "hr_manager", "created_at")
-    search_fields = ("full_name", "region", "work_position")
-
+    search_fields = ("full_name", "phone", "region", "work_position")
 
-def strip_tz(dt):
-    """Excel uchun timezone olib tashlash"""
-    return dt.replace(tzinfo=None) if dt else None
 
 @admin.register(Attempt)
 class UrinishAdmin(admin.ModelAdmin):
@@ -58,6 +76,8 @@ class UrinishAdmin(admin.ModelAdmin):
         "exam_link",
     )
     list_filter = ("exam", "submitted_at", "candidate__region", "candidate__hr_manager")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     search_fields = (
         "candidate__full_name",
         "candidate__phone",
@@ -67,8 +87,14 @@ class UrinishAdmin(admin.ModelAdmin):
         "token",
     )
     readonly_fields = ("token", "exam_link", "started_at", "submitted_at")
+    autocomplete_fields = ("candidate", "exam")
 
-    actions = ["export_attempts_excel"]
+    actions = [
+        "export_attempts_excel",
+        "export_attempts_excel_by_exam",
+        background_export("attempts_xlsx"),
+        background_export("attempts_by_exam_xlsx"),
+    ]
 
     def phone(self, obj):
         return obj.candidate.phone
@@ -91,6 +117,10 @@ class UrinishAdmin(admin.ModelAdmin):
 
     exam_link.short_description = "Imtihon havolasi"
 
+    def get_queryset(self, request):
+        # __str__ shows exam and candidate, also in autocomplete results
+        return super().get_queryset(request).select_related("candidate", "exam")
+
     def export_attempts_excel(self, request, queryset):
         """
         Tanlangan urinishlarni Excelga eksport qilish
@@ -100,98 +130,23 @@ class UrinishAdmin(admin.ModelAdmin):
         - Har bir savol ustun ko‘rinishida
         - Javob matni: to‘g‘ri yashil, noto‘g‘ri qizil
         """
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Urinishlar"
-
-        # Savollar to‘plami (universal tartib)
-        all_questions = []
-        for attempt in queryset:
-            for q in attempt.exam.questions.all():
-                if q not in all_questions:
-                    all_questions.append(q)
-
-        # Sarlavha qatori
-        headers = [
-            "Nomzod",
-            "Telefon",
-            "Hudud",
-            "Lavozim",
-            "HR menejer",
-            "Imtihon",
-            "Ball",
-            "Boshlangan vaqt",
-            "Yakunlangan vaqt",
-        ]
-        headers += [q.text[:50] for q in all_questions]  # savol matnini qisqartirish
-        ws.append(headers)
-
-        # Ranglar
-        green_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
-        red_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-
-        # Ma’lumotlar qatori
-        for attempt in queryset:
-            row = [
-                attempt.candidate.full_name,
-                attempt.candidate.phone,
-                attempt.candidate.region,
-                attempt.candidate.work_position,
-                attempt.candidate.hr_manager,
-                attempt.exam.title,
-                attempt.score,
-                strip_tz(attempt.started_at),
-                strip_tz(attempt.submitted_at),
-            ]
-
-            answers_map = {a.question_id: a for a in attempt.answers.all()}
-
-            for q in all_questions:
-                ans = answers_map.get(q.id)
-                if ans:
-                    if ans.choice:
-                        cell_value = ans.choice.text
-                    else:
-                        cell_value = ans.text_answer
-                else:
-                    cell_value = ""
-                row.append(cell_value)
-
-            ws.append(row)
-
-            # Rang berish
-            excel_row = ws.max_row
-            first_question_col = len(headers) - len(all_questions) + 1
-            for col_offset, q in enumerate(all_questions):
-                ans = answers_map.get(q.id)
-                cell = ws.cell(row=excel_row, column=first_question_col + col_offset)
-                if ans:
-                    if ans.is_correct:
-                        cell.fill = green_fill
-                    else:
-                        cell.fill = red_fill
-
-        # Sana va vaqt formatlash
-        for col in ("H", "I"):  # Boshlangan va Yakunlangan
-            for cell in ws[col]:
-                if cell.row == 1:
-                    continue
-                if cell.value:
-                    cell.number_format = "DD.MM.YYYY HH:MM"
-
-        # Javob
-        response = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        response["Content-Disposition"] = 'attachment; filename="urinishlar.xlsx"'
-        wb.save(response)
-        return response
+        return attempts_xlsx(queryset)
 
     export_attempts_excel.short_description = "Tanlanganlarni Excelga yuklash"
 
+    def export_attempts_excel_by_exam(self, request, queryset):
+        """Har bir imtihon alohida varaqda"""
+        return attempts_xlsx(queryset, per_exam=True)
+
+    export_attempts_excel_by_exam.short_description = "Tanlanganlarni Excelga yuklash (imtihonlar bo‘yicha)"
+
 
 @admin.register(Answer)
 class JavobAdmin(admin.ModelAdmin):
     list_display = ("attempt", "question", "choice", "text_answer", "is_correct")
     list_filter = ("is_correct", "question__exam")
+    list_select_related = ("attempt__exam", "attempt__candidate", "question__exam", "choice")
+    autocomplete_fields = ("attempt", "question", "choice")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     search_fields = ("attempt__candidate__full_name", "question__text")
@@ -0,0 +1,68 @@
+import threading
+from typing import NamedTuple
+
+from django.db.models import F
+
+from .models import Choice, Exam, Question
+
+
+class QuestionKey(NamedTuple):
+    qtype: str
+    choices: frozenset  # valid choice ids
+    correct: frozenset  # ids of the correct choices
+
+
+def compile_key(exam_id):
+    """question_id -> QuestionKey for every question of an exam, in two queries."""
+    choices = {}
+    correct = {}
+    for pk, question_id, is_correct in Choice.objects.filter(question__exam_id=exam_id).values_list(
+        "pk", "question_id", "is_correct"
+    ):
+        choices.setdefault(question_id, set()).add(pk)
+        if is_correct:
+            correct.setdefault(question_id, set()).add(pk)
+    return {
+        qid: QuestionKey(qtype, frozenset(choices.get(qid, ())), frozenset(correct.get(qid, ())))
+        for qid, qtype in Question.objects.filter(exam_id=exam_id).values_list("pk", "qtype")
+    }
+
+
+class AnswerKeyCache:
+    """
+    Process-local compiled answer keys, one per exam, tagged with Exam.version.
+
+    Saving or deleting a Question or Choice bumps the exam's version (see
+    signals), so a key is rebuilt lazily the first time a caller presents a
+    newer version -- also in processes that never saw the signal.
+    """
+
+    def __init__(self):
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def get(self, exam):
+        cached = self._keys.get(exam.pk)
+        if cached is not None and cached[0] == exam.version:
+            return cached[1]
+        key = compile_key(exam.pk)
+        with self._lock:
+            self._keys[exam.pk] = (exam.version, key)
+        return key
+
+    def discard(self, exam_id):
+        with self._lock:
+            self._keys.pop(exam_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+
+answer_keys = AnswerKeyCache()
+
+
+def bump_version(exam_id):
+    """Mark an exam's questions as changed."""
+    Exam.objects.filter(pk=exam_id).update(version=F("version") + 1)
+    answer_keys.discard(exam_id)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ExamConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'exam'
+
+    def ready(self):
+        from . import signals
+        signals.connect()
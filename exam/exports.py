@@ -0,0 +1,138 @@
+import re
+import tempfile
+from itertools import islice
+
+import openpyxl
+from django.http import FileResponse
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill
+
+from .models import Answer, Question
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+HEADERS = [
+    "Nomzod",
+    "Telefon",
+    "Hudud",
+    "Lavozim",
+    "HR menejer",
+    "Imtihon",
+    "Ball",
+    "Boshlangan vaqt",
+    "Yakunlangan vaqt",
+]
+
+GREEN_FILL = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
+RED_FILL = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
+DATE_FORMAT = "DD.MM.YYYY HH:MM"
+
+
+def strip_tz(dt):
+    """Excel uchun timezone olib tashlash"""
+    return dt.replace(tzinfo=None) if dt else None
+
+
+def _chunks(iterable, size):
+    it = iter(iterable)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+class AttemptSheet:
+    """One worksheet: a fixed question -> column mapping and the styled cell factories."""
+
+    def __init__(self, wb, title, questions):
+        self.ws = wb.create_sheet(re.sub(r"[\\/*?:\[\]]", " ", title)[:31])
+        self.columns = {qid: i for i, (qid, _) in enumerate(questions)}
+        self.width = len(questions)
+        self.ws.append(HEADERS + [text[:50] for _, text in questions])
+
+    def _date(self, value):
+        cell = WriteOnlyCell(self.ws, value=strip_tz(value))
+        if value:
+            cell.number_format = DATE_FORMAT
+        return cell
+
+    def append(self, attempt, answers):
+        candidate = attempt.candidate
+        row = [
+            candidate.full_name,
+            candidate.phone,
+            candidate.region,
+            candidate.work_position,
+            candidate.hr_manager,
+            attempt.exam.title,
+            attempt.score,
+            self._date(attempt.started_at),
+            self._date(attempt.submitted_at),
+        ]
+        cells = [""] * self.width
+        for question_id, choice_text, text_answer, is_correct in answers:
+            col = self.columns.get(question_id)
+            if col is None:
+                continue
+            cell = WriteOnlyCell(self.ws, value=choice_text if choice_text is not None else text_answer)
+            cell.fill = GREEN_FILL if is_correct else RED_FILL
+            cells[col] = cell
+        self.ws.append(row + cells)
+
+
+def attempts_workbook(queryset, per_exam=False, chunk_size=500, progress=None):
+    """
+    Write-only workbook with one row per attempt and one column per question.
+
+    Questions are read once for all exams involved; answers are fetched as
+    plain tuples (with the choice text joined in) one query per chunk of
+    attempts, and every cell is styled as it is written. progress, if
+    given, is called with the number of attempts written after each chunk.
+    """
+    queryset = queryset.select_related("candidate", "exam")
+    exam_ids = set(queryset.values_list("exam_id", flat=True).order_by())
+    questions = {}
+    for qid, exam_id, text in (
+        Question.objects.filter(exam_id__in=exam_ids)
+        .order_by("exam_id", "order", "id")
+        .values_list("id", "exam_id", "text")
+    ):
+        questions.setdefault(exam_id, []).append((qid, text))
+
+    wb = openpyxl.Workbook(write_only=True)
+    if per_exam:
+        queryset = queryset.order_by("exam_id", "pk")
+        sheets = {}
+    else:
+        queryset = queryset.order_by("pk")
+        sheet = AttemptSheet(wb, "Urinishlar", [q for exam_id in sorted(questions) for q in questions[exam_id]])
+
+    done = 0
+    for chunk in _chunks(queryset.iterator(chunk_size=chunk_size), chunk_size):
+        answers = {}
+        for attempt_id, *answer in (
+            Answer.objects.filter(attempt_id__in=[a.pk for a in chunk])
+            .values_list("attempt_id", "question_id", "choice__text", "text_answer", "is_correct")
+        ):
+            answers.setdefault(attempt_id, []).append(answer)
+
+        for attempt in chunk:
+            if per_exam:
+                sheet = sheets.get(attempt.exam_id)
+                if sheet is None:
+                    sheet = sheets[attempt.exam_id] = AttemptSheet(
+                        wb, f"{attempt.exam_id}. {attempt.exam.title}", questions.get(attempt.exam_id, [])
+                    )
+            sheet.append(attempt, answers.get(attempt.pk, ()))
+
+        done += len(chunk)
+        if progress:
+            progress(done)
+
+    return wb
+
+
+def attempts_xlsx(queryset, per_exam=False, filename="urinishlar.xlsx"):
+    wb = attempts_workbook(queryset, per_exam=per_exam)
+    tmp = tempfile.TemporaryFile()
+    wb.save(tmp)
+    tmp.seek(0)
+    return FileResponse(tmp, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
@@ -1,7 +1,30 @@
 from django import forms
 from .models import Candidate
+from .phones import normalize_phone
 
 class CandidateRegistrationForm(forms.ModelForm):
     class Meta:
         model = Candidate
         fields = ["full_name", "phone", "region", "work_position", "hr_manager"]
+
+    def clean_phone(self):
+        phone = self.cleaned_data["phone"]
+        if normalize_phone(phone) is None:
+            raise forms.ValidationError("Telefon raqamini to‘g‘ri kiriting, masalan +998 90 123 45 67")
+        return phone
+
+
+class CandidateAdminForm(forms.ModelForm):
+    class Meta:
+        model = Candidate
+        fields = "__all__"
+
+    def clean_phone(self):
+        # phone_normalized is not on the form, so Django's unique check skips it
+        phone = self.cleaned_data["phone"]
+        key = normalize_phone(phone)
+        if key and (self.instance._state.adding or "phone" in self.changed_data):
+            duplicate = Candidate.objects.filter(phone_normalized=key).exclude(pk=self.instance.pk).first()
+            if duplicate:
+                raise forms.ValidationError(f"Bu raqam bilan nomzod allaqachon bor: {duplicate}")
+        return phone
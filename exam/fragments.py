@@ -0,0 +1,53 @@
+import threading
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+# Fragments only change with the exam's questions, which bump Exam.version
+TIMEOUT = 24 * 60 * 60
+
+
+class FragmentStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+stats = FragmentStats()
+
+
+def cache_key(exam):
+    return f"exam:{exam.pk}:v{exam.version}:questions"
+
+
+def question_fragments(exam):
+    """question_id -> rendered exams/_question.html for every question of the exam."""
+    key = cache_key(exam)
+    fragments = cache.get(key)
+    stats.record(fragments is not None)
+    if fragments is None:
+        fragments = {
+            q.id: render_to_string("exams/_question.html", {"q": q})
+            for q in exam.questions.prefetch_related("choices")
+        }
+        cache.set(key, fragments, TIMEOUT)
+    return fragments
+
+
+def render_questions(exam, question_order):
+    """The question list of an attempt, assembled from cached fragments in its order."""
+    fragments = question_fragments(exam)
+    return mark_safe("".join(fragments[qid] for qid in question_order if qid in fragments))
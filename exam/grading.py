@@ -0,0 +1,227 @@
+import operator
+from datetime import timedelta
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .answer_keys import answer_keys
+from .models import Answer, Attempt, Exam, Question
+
+CHOICE_TYPES = (Question.MCQ, Question.TRUE_FALSE)
+
+
+def grade(attempt, data, key, blank_missing=False):
+    """
+    Unsaved Answer rows for the questions of an attempt that appear in data
+    (all of them with blank_missing, unanswered ones left blank), without
+    touching the database. data maps "q-<id>" to the posted value, key is
+    the exam's compiled answer key; questions that no longer exist are
+    skipped.
+    """
+    answers = []
+    for qid in attempt.question_order:
+        name = f"q-{qid}"
+        question = key.get(qid)
+        if question is None or (name not in data and not blank_missing):
+            continue
+        val = data.get(name)
+        val = "" if val is None else str(val).strip()
+        ans = Answer(attempt=attempt, question_id=qid)
+
+        if question.qtype in CHOICE_TYPES:
+            try:
+                choice_id = int(val)
+            except ValueError:
+                choice_id = None
+            if choice_id in question.choices:
+                ans.choice_id = choice_id
+                ans.is_correct = choice_id in question.correct
+        elif question.qtype == Question.SHORT:
+            ans.text_answer = val
+
+        answers.append(ans)
+    return answers
+
+
+def store(answers, keep_stored=False):
+    """
+    Insert answers, replacing earlier ones for the same question, in one
+    query. With keep_stored, blank answers only fill in questions that have
+    nothing saved yet.
+    """
+    if keep_stored:
+        blank = [a for a in answers if a.choice_id is None and not a.text_answer]
+        if blank:
+            Answer.objects.bulk_create(blank, ignore_conflicts=True)
+            answers = [a for a in answers if a.choice_id is not None or a.text_answer]
+    if answers:
+        Answer.objects.bulk_create(
+            answers,
+            update_conflicts=True,
+            unique_fields=["attempt", "question"],
+            update_fields=["choice", "text_answer", "is_correct", "answered_at"],
+        )
+
+
+def rescore(answers, key):
+    """
+    Check stored answers against the current key. Returns the answers whose
+    is_correct changed (updated in place, not saved) and attempt_id -> score.
+    """
+    changed = []
+    scores = {}
+    for answer in answers:
+        question = key.get(answer.question_id)
+        if question is not None and question.qtype in CHOICE_TYPES:
+            is_correct = answer.choice_id in question.correct
+            if is_correct != answer.is_correct:
+                answer.is_correct = is_correct
+                changed.append(answer)
+        scores[answer.attempt_id] = scores.get(answer.attempt_id, 0) + answer.is_correct
+    return changed, scores
+
+
+def stored_answers(**filters):
+    return Answer.objects.filter(**filters).only(
+        "pk", "attempt_id", "question_id", "choice_id", "is_correct"
+    )
+
+
+def autosave(attempt, data, key=None):
+    """
+    Store the answers in data while the attempt is still open. Returns the
+    number of answers saved, or None when the attempt is already submitted.
+    """
+    if key is None:
+        key = answer_keys.get(attempt.exam)
+    answers = grade(attempt, data, key)
+
+    with transaction.atomic():
+        # Serialises with submit, so nothing lands after the score is taken
+        if not Attempt.objects.select_for_update().filter(pk=attempt.pk, submitted_at__isnull=True).exists():
+            return None
+        store(answers)
+    return len(answers)
+
+
+def submit(attempt, data, focus_violations=0, key=None):
+    """
+    Store whatever answers are still in data (blanks never replace saved
+    answers) and grade everything saved for the attempt, in one short
+    transaction.
+
+    Returns False when the attempt had already been submitted, e.g. by a
+    parallel request; nothing is written then.
+    """
+    if key is None:
+        key = answer_keys.get(attempt.exam)
+    # Unanswered questions still get a blank row, which the export shows as wrong
+    answers = grade(attempt, data, key, blank_missing=True)
+
+    with transaction.atomic():
+        submitted = Attempt.objects.filter(pk=attempt.pk, submitted_at__isnull=True).update(
+            submitted_at=timezone.now(),
+            focus_violations=focus_violations,
+        )
+        if not submitted:
+            return False
+        # The timer posts the form as it is, so an empty field must not wipe
+        # an answer autosaved before a reload or a dropped connection
+        store(answers, keep_stored=True)
+        changed, scores = rescore(stored_answers(attempt=attempt), key)
+        Answer.objects.bulk_update(changed, ["is_correct"])
+        Attempt.objects.filter(pk=attempt.pk).update(score=scores.get(attempt.pk, 0))
+    return True
+
+
+def regrade(exam):
+    """
+    Re-check every stored choice answer of an exam against its current key,
+    e.g. after a wrong answer was marked correct. Returns the number of
+    attempts whose score changed.
+    """
+    key = answer_keys.get(exam)
+    changed_answers, scores = rescore(stored_answers(attempt__exam=exam).iterator(chunk_size=2000), key)
+
+    attempts = [
+        attempt
+        for attempt in Attempt.objects.filter(exam=exam, submitted_at__isnull=False).only("pk", "score")
+        if attempt.score != scores.get(attempt.pk, 0)
+    ]
+    for attempt in attempts:
+        attempt.score = scores.get(attempt.pk, 0)
+    with transaction.atomic():
+        Answer.objects.bulk_update(changed_answers, ["is_correct"], batch_size=1000)
+        Attempt.objects.bulk_update(attempts, ["score"], batch_size=1000)
+    return len(attempts)
+
+
+def expired_attempts(now=None, grace=0):
+    """
+    Unsubmitted attempts whose time ran out at least `grace` seconds ago.
+    Exams are grouped by duration so the attempts are found with one query
+    on the (submitted_at, started_at) index.
+    """
+    now = now or timezone.now()
+    by_duration = {}
+    for pk, minutes in Exam.objects.values_list("pk", "duration_minutes"):
+        by_duration.setdefault(minutes, []).append(pk)
+    if not by_duration:
+        return Attempt.objects.none()
+    expired = reduce(operator.or_, (
+        Q(exam_id__in=exam_ids, started_at__lt=now - timedelta(minutes=minutes, seconds=grace))
+        for minutes, exam_ids in by_duration.items()
+    ))
+    return Attempt.objects.filter(expired, submitted_at__isnull=True)
+
+
+def finalize(attempt_ids, now=None):
+    """
+    Submit and grade the given attempts from their stored answers in one
+    transaction. Attempts another process (or the candidate) submitted
+    first are skipped. Returns the number finalized.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        pending = list(
+            Attempt.objects.filter(pk__in=attempt_ids, submitted_at__isnull=True)
+            .values_list("pk", "exam_id", "question_order")
+        )
+        # Claimed one by one: the row count tells which attempts this call
+        # submitted, even where the backend cannot lock rows (SQLite)
+        by_exam, orders = {}, {}
+        for pk, exam_id, question_order in pending:
+            if Attempt.objects.filter(pk=pk, submitted_at__isnull=True).update(submitted_at=now):
+                by_exam.setdefault(exam_id, []).append(pk)
+                orders[pk] = question_order
+        if not by_exam:
+            return 0
+
+        changed, scores = [], {}
+        for exam in Exam.objects.filter(pk__in=by_exam):
+            key = answer_keys.get(exam)
+            # Blank rows for unanswered questions, as submit() writes them
+            store([
+                Answer(attempt_id=pk, question_id=qid)
+                for pk in by_exam[exam.pk] for qid in orders[pk] if qid in key
+            ], keep_stored=True)
+            exam_changed, exam_scores = rescore(stored_answers(attempt_id__in=by_exam[exam.pk]), key)
+            changed += exam_changed
+            scores.update(exam_scores)
+
+        attempts = [Attempt(pk=pk, score=scores.get(pk, 0)) for ids in by_exam.values() for pk in ids]
+        Answer.objects.bulk_update(changed, ["is_correct"], batch_size=1000)
+        Attempt.objects.bulk_update(attempts, ["score"], batch_size=1000)
+    return len(attempts)
+
+
+def saved_values(attempt):
+    """The attempt's stored answers as "q-<id>" -> form value, to refill the exam page."""
+    values = {}
+    for question_id, choice_id, text_answer in attempt.answers.values_list("question_id", "choice_id", "text_answer"):
+        value = str(choice_id) if choice_id is not None else text_answer
+        if value:
+            values[f"q-{question_id}"] = value
+    return values
@@ -0,0 +1,67 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from exam.exports import attempts_xlsx
+from exam.models import Answer, Attempt, Candidate, Choice, Exam, Question
+
+
+class Command(BaseCommand):
+    help = "Time the attempt-matrix Excel export on synthetic data (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--attempts", type=int, default=5000)
+        parser.add_argument("--questions", type=int, default=50)
+        parser.add_argument("--per-exam", action="store_true")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            queryset = self.populate(options["attempts"], options["questions"])
+            self.run(queryset, options["per_exam"])
+            transaction.set_rollback(True)
+
+    def populate(self, n_attempts, n_questions):
+        started = time.perf_counter()
+        exam = Exam.objects.create(title="Benchmark")
+        questions = Question.objects.bulk_create(
+            Question(exam=exam, text=f"Savol {i}", order=i) for i in range(n_questions)
+        )
+        choices = Choice.objects.bulk_create(
+            Choice(question=q, text=f"Variant {q.order}.{k}", is_correct=k == 0)
+            for q in questions for k in range(4)
+        )
+        candidates = Candidate.objects.bulk_create(
+            Candidate(full_name=f"Nomzod {i}", phone=f"+99890{i:07d}", region="Toshkent",
+                      work_position="Kassir", hr_manager="Boshqa")
+            for i in range(n_attempts)
+        )
+        attempts = Attempt.objects.bulk_create(
+            Attempt(candidate=c, exam=exam, score=0, total_questions=n_questions) for c in candidates
+        )
+        Answer.objects.bulk_create(
+            (
+                Answer(attempt=a, question=q, choice=choices[q.order * 4 + (a.pk + q.order) % 4],
+                       is_correct=(a.pk + q.order) % 4 == 0)
+                for a in attempts for q in questions
+            ),
+            batch_size=2000,
+        )
+        self.stdout.write(
+            f"Populated {n_attempts} attempts x {n_questions} questions "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+        return Attempt.objects.filter(exam=exam)
+
+    def run(self, queryset, per_exam):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = attempts_xlsx(queryset, per_exam=per_exam)
+            elapsed = time.perf_counter() - started
+        size = os.fstat(response.file_to_stream.fileno()).st_size
+        response.close()
+        self.stdout.write(self.style.SUCCESS(
+            f"Export: {elapsed:.2f}s, {len(ctx.captured_queries)} queries, {size / 1024:.0f} KiB"
+        ))
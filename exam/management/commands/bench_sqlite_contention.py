@@ -0,0 +1,125 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Submit exams from several processes at once against a scratch SQLite file, "
+        "with and without SQLITE_PRODUCTION, and report throughput and lock errors"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=8)
+        parser.add_argument("--attempts", type=int, default=400)
+        parser.add_argument("--questions", type=int, default=30)
+        # Internal: the seeding and worker steps run in child processes
+        parser.add_argument("--seed", action="store_true", help="(internal)")
+        parser.add_argument("--worker", type=int, default=None, help="(internal)")
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            return self.seed(options["attempts"], options["questions"])
+        if options["worker"] is not None:
+            return self.work(options["worker"], options["processes"])
+
+        self.stdout.write(f"{'mode':<12}{'submits/s':>12}{'ok':>8}{'locked':>8}{'p95 ms':>10}")
+        for production in (False, True):
+            result = self.run_mode(production, options)
+            self.stdout.write(
+                f"{'production' if production else 'default':<12}{result['rate']:>12.1f}"
+                f"{result['ok']:>8}{result['locked']:>8}{result['p95_ms']:>10.0f}"
+            )
+
+    def child(self, env, *args):
+        return subprocess.Popen(
+            [sys.executable, "manage.py", "bench_sqlite_contention", *args],
+            env=env, cwd=settings.BASE_DIR, stdout=subprocess.PIPE, text=True,
+        )
+
+    def run_mode(self, production, options):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(
+                os.environ,
+                SQLITE_PATH=os.path.join(tmp, "bench.sqlite3"),
+                SQLITE_PRODUCTION="1" if production else "0",
+                DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE,
+            )
+            subprocess.run(
+                [sys.executable, "manage.py", "migrate", "-v0"],
+                env=env, cwd=settings.BASE_DIR, check=True,
+            )
+            seed = self.child(env, "--seed", f"--attempts={options['attempts']}", f"--questions={options['questions']}")
+            seed.communicate()
+
+            n = options["processes"]
+            started = time.perf_counter()
+            workers = [self.child(env, f"--worker={i}", f"--processes={n}") for i in range(n)]
+            results = [json.loads(w.communicate()[0].strip().splitlines()[-1]) for w in workers]
+            elapsed = time.perf_counter() - started
+
+        latencies = sorted(ms for r in results for ms in r["latencies"])
+        ok = sum(r["ok"] for r in results)
+        return {
+            "rate": ok / elapsed,
+            "ok": ok,
+            "locked": sum(r["locked"] for r in results),
+            "p95_ms": latencies[int(len(latencies) * 0.95)] if latencies else 0,
+        }
+
+    def seed(self, n_attempts, n_questions):
+        from exam.models import Attempt, Candidate, Choice, Exam, Question
+
+        exam = Exam.objects.create(title="Benchmark", shuffle_questions=False)
+        questions = Question.objects.bulk_create(
+            Question(exam=exam, text=f"Savol {i}", order=i) for i in range(n_questions)
+        )
+        Choice.objects.bulk_create(
+            Choice(question=q, text=f"Variant {k}", is_correct=k == 0) for q in questions for k in range(4)
+        )
+        candidates = Candidate.objects.bulk_create(
+            Candidate(full_name=f"Nomzod {i}", phone=f"+99890{i:07d}", region="Toshkent",
+                      work_position="Kassir", hr_manager="Boshqa")
+            for i in range(n_attempts)
+        )
+        Attempt.objects.bulk_create(
+            Attempt(candidate=c, exam=exam, started_at=timezone.now(),
+                    question_order=[q.pk for q in questions], total_questions=n_questions)
+            for c in candidates
+        )
+
+    def work(self, index, processes):
+        from django.test import Client
+
+        from exam.models import Attempt, Choice
+
+        attempts = list(Attempt.objects.order_by("pk").values_list("token", "question_order"))[index::processes]
+        choices = {}
+        for pk, question_id in Choice.objects.values_list("pk", "question_id"):
+            choices.setdefault(question_id, []).append(pk)
+
+        client = Client()
+        ok = locked = 0
+        latencies = []
+        for token, question_order in attempts:
+            data = {f"q-{qid}": random.choice(choices[qid]) for qid in question_order}
+            started = time.perf_counter()
+            try:
+                client.post(f"/exam/{token}/submit/", data)
+                ok += 1
+            except OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                locked += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        self.stdout.write(json.dumps({"ok": ok, "locked": locked, "latencies": latencies}))
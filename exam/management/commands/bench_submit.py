@@ -0,0 +1,60 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from exam.models import Attempt, Candidate, Choice, Exam, Question
+
+
+class Command(BaseCommand):
+    help = "Measure exam_submit latency and queries against the number of questions (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--questions", type=int, nargs="+", default=[10, 25, 50, 100])
+        parser.add_argument("--submits", type=int, default=50)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'questions':>10}{'p50 ms':>10}{'p95 ms':>10}{'queries':>10}")
+        with transaction.atomic():
+            for n in options["questions"]:
+                p50, p95, queries = self.run(n, options["submits"])
+                self.stdout.write(f"{n:>10}{p50:>10.1f}{p95:>10.1f}{queries:>10}")
+            transaction.set_rollback(True)
+
+    def run(self, n_questions, n_submits):
+        exam = Exam.objects.create(title=f"Benchmark {n_questions}", shuffle_questions=False)
+        questions = Question.objects.bulk_create(
+            Question(exam=exam, text=f"Savol {i}", order=i) for i in range(n_questions)
+        )
+        choices = Choice.objects.bulk_create(
+            Choice(question=q, text=f"Variant {k}", is_correct=k == 0) for q in questions for k in range(4)
+        )
+        order = [q.pk for q in questions]
+        attempts = [
+            Attempt.objects.create(
+                candidate=Candidate.objects.create(
+                    full_name="Bench", phone=f"+9989{n_questions:03d}{i:05d}", region="-",
+                    work_position="-", hr_manager="Boshqa",
+                ),
+                exam=exam, started_at=timezone.now(), question_order=order, total_questions=n_questions,
+            )
+            for i in range(n_submits)
+        ]
+
+        client = Client()
+        latencies = []
+        queries = 0
+        for attempt in attempts:
+            data = {f"q-{q.pk}": random.choice(choices[i * 4:i * 4 + 4]).pk for i, q in enumerate(questions)}
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                client.post(f"/exam/{attempt.token}/submit/", data)
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries = len(ctx.captured_queries)
+
+        latencies.sort()
+        return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)], queries
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from exam import grading
+
+
+class Command(BaseCommand):
+    help = (
+        "Submit and grade attempts whose time ran out, from the answers saved so far. "
+        "Safe to run on several hosts at once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument("--once", action="store_true", help="Exit after one pass")
+        parser.add_argument("--interval", type=float, default=60.0, help="Seconds between passes")
+
+    def handle(self, *args, **options):
+        while True:
+            finalized = self.sweep(options["batch_size"])
+            if finalized:
+                self.stdout.write(f"Finalized {finalized} expired attempts")
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
+
+    def sweep(self, batch_size):
+        # Late autosave batches are still accepted during the grace period
+        ids = list(grading.expired_attempts(grace=settings.EXAM_AUTOSAVE_GRACE).values_list("pk", flat=True))
+        return sum(grading.finalize(ids[i:i + batch_size]) for i in range(0, len(ids), batch_size))
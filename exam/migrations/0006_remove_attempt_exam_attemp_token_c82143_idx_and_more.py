@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0005_alter_answer_options_alter_attempt_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='attempt',
+            name='exam_attemp_token_c82143_idx',
+        ),
+        migrations.AddIndex(
+            model_name='attempt',
+            index=models.Index(fields=['submitted_at', 'started_at'], name='exam_attemp_submitt_df645b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='candidate',
+            index=models.Index(fields=['phone'], name='exam_candid_phone_5868d0_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:35
+
+from django.db import migrations, models
+
+from exam.phones import normalize_phone
+
+
+def backfill(apps, schema_editor):
+    """
+    Fill phone_normalized in bulk. When several candidates share a number
+    the oldest one keeps the key; the others stay NULL so the unique index
+    in the next migration can be built (merge them in the admin if needed).
+    """
+    Candidate = apps.get_model("exam", "Candidate")
+    taken = set()
+    batch = []
+    for candidate in Candidate.objects.order_by("pk").only("pk", "phone").iterator(chunk_size=2000):
+        key = normalize_phone(candidate.phone)
+        if key is None or key in taken:
+            continue
+        taken.add(key)
+        candidate.phone_normalized = key
+        batch.append(candidate)
+        if len(batch) >= 1000:
+            Candidate.objects.bulk_update(batch, ["phone_normalized"])
+            batch = []
+    Candidate.objects.bulk_update(batch, ["phone_normalized"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0006_remove_attempt_exam_attemp_token_c82143_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='candidate',
+            name='phone_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=16, null=True, verbose_name='Telefon (normallashtirilgan)'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0007_candidate_phone_normalized'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='candidate',
+            name='phone_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=16, null=True, unique=True, verbose_name='Telefon (normallashtirilgan)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0008_candidate_phone_normalized_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
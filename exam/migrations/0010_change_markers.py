@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0009_exam_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='candidate',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Yangilangan vaqt'),
+        ),
+        migrations.AddField(
+            model_name='exam',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Yangilangan vaqt'),
+        ),
+    ]
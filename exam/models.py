@@ -2,10 +2,16 @@ import uuid
 from django.db import models
 from django.utils import timezone
 
+from .phones import normalize_phone
+
 
 class Candidate(models.Model):
     full_name = models.CharField("F.I.Sh", max_length=150)
     phone = models.CharField("Telefon", max_length=50)
+    # Lookup key for phone, see normalize_phone
+    phone_normalized = models.CharField(
+        "Telefon (normallashtirilgan)", max_length=16, unique=True, null=True, blank=True, editable=False
+    )
     region = models.CharField("Hudud", max_length=100)
     work_position = models.CharField("Lavozim", max_length=100)
 
@@ -18,14 +24,31 @@ class Candidate(models.Model):
     hr_manager = models.CharField("HR menejer", max_length=50, choices=HR_CHOICES)
 
     created_at = models.DateTimeField("Ro‘yxatdan o‘tgan vaqt", auto_now_add=True)
+    updated_at = models.DateTimeField("Yangilangan vaqt", auto_now=True)
 
     class Meta:
+        indexes = [models.Index(fields=["phone"])]
         verbose_name = "Nomzod"
         verbose_name_plural = "Nomzodlar"
 
     def __str__(self):
         return f"{self.full_name} ({self.phone})"
 
+    def save(self, *args, **kwargs):
+        key = normalize_phone(self.phone)
+        if key != self.phone_normalized:
+            # Duplicates left by the 0007 backfill keep their NULL key rather
+            # than colliding with the candidate that holds it; for any other
+            # row a taken number is left to the unique index
+            backfilled = not self._state.adding and self.phone_normalized is None
+            if backfilled and key and Candidate.objects.filter(phone_normalized=key).exclude(pk=self.pk).exists():
+                key = None
+            self.phone_normalized = key
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "phone" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "phone_normalized"}
+        super().save(*args, **kwargs)
+
 
 class Exam(models.Model):
     title = models.CharField("Imtihon nomi", max_length=200)
@@ -36,6 +59,9 @@ class Exam(models.Model):
     max_focus_violations = models.PositiveIntegerField(
         "Maks. fokus buzilishlar soni", default=0
     )
+    # Bumped whenever a question or choice changes; tags cached answer keys
+    version = models.PositiveIntegerField(default=1, editable=False)
+    updated_at = models.DateTimeField("Yangilangan vaqt", auto_now=True)
 
     class Meta:
         verbose_name = "Imtihon"
@@ -44,6 +70,16 @@ class Exam(models.Model):
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # version only moves through bump_version(); a stale instance must
+        # not write back the number it was loaded with
+        if not self._state.adding:
+            update_fields = kwargs.get("update_fields")
+            if update_fields is None:
+                update_fields = [f.name for f in self._meta.concrete_fields if not f.primary_key]
+            kwargs["update_fields"] = [name for name in update_fields if name != "version"]
+        super().save(*args, **kwargs)
+
     @property
     def total_questions(self):
         return self.questions.count()
@@ -116,7 +152,8 @@ class Attempt(models.Model):
     user_agent = models.TextField("Brauzer ma’lumoti", blank=True)
 
     class Meta:
-        indexes = [models.Index(fields=["token"])]
+        # token is already indexed by its unique constraint
+        indexes = [models.Index(fields=["submitted_at", "started_at"])]
         unique_together = ("candidate", "exam")
         verbose_name = "Urinish"
         verbose_name_plural = "Urinishlar"
@@ -0,0 +1,26 @@
+import re
+
+# Numbers written without a country code are Uzbek
+DEFAULT_COUNTRY_CODE = "998"
+LOCAL_LENGTH = 9
+
+
+def normalize_phone(raw):
+    """
+    E.164-style key for a phone number ("+998901234567"), or None if it
+    cannot be a phone number.
+
+    "+998 90 123-45-67", "998901234567", "00998901234567", "90 123 45 67"
+    and "8 90 123 45 67" all give the same key.
+    """
+    digits = re.sub(r"\D", "", raw or "")
+    if digits.startswith("00"):
+        digits = digits[2:]
+    if len(digits) == LOCAL_LENGTH:
+        digits = DEFAULT_COUNTRY_CODE + digits
+    elif len(digits) == LOCAL_LENGTH + 1 and digits.startswith("8"):
+        # Old domestic trunk prefix
+        digits = DEFAULT_COUNTRY_CODE + digits[1:]
+    if not 8 <= len(digits) <= 15:
+        return None
+    return "+" + digits
@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+
+from .answer_keys import bump_version
+from .models import Choice, Question
+
+
+def question_changed(instance, **kwargs):
+    bump_version(instance.exam_id)
+
+
+def choice_changed(instance, **kwargs):
+    exam_id = Question.objects.filter(pk=instance.question_id).values_list("exam_id", flat=True).first()
+    if exam_id is not None:
+        bump_version(exam_id)
+
+
+def connect():
+    post_save.connect(question_changed, sender=Question, dispatch_uid="answer-key-question-save")
+    post_delete.connect(question_changed, sender=Question, dispatch_uid="answer-key-question-delete")
+    post_save.connect(choice_changed, sender=Choice, dispatch_uid="answer-key-choice-save")
+    post_delete.connect(choice_changed, sender=Choice, dispatch_uid="answer-key-choice-delete")
@@ -1,3 +1,403 @@
+import io
+from unittest import mock
+
+import openpyxl
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
 from django.test import TestCase
+from django.utils import timezone
+
+from conf.testing import QueryPlanTestCase
+
+from . import fragments, grading
+from .answer_keys import answer_keys
+from .exports import attempts_workbook, attempts_xlsx
+from .models import Answer, Attempt, Candidate, Choice, Exam, Question
+from .phones import normalize_phone
+
+
+def make_candidate(i):
+    return Candidate.objects.create(
+        full_name=f"Nomzod {i}", phone=f"+99890{i:07d}", region="Toshkent",
+        work_position="Kassir", hr_manager="Boshqa",
+    )
+
+
+class AttemptExportTests(TestCase):
+    def setUp(self):
+        self.exams = [Exam.objects.create(title=f"Imtihon {i}") for i in range(2)]
+        for exam in self.exams:
+            for order in range(3):
+                q = Question.objects.create(exam=exam, text=f"{exam.title} savol {order}", order=order)
+                Choice.objects.create(question=q, text="To‘g‘ri", is_correct=True)
+                Choice.objects.create(question=q, text="Noto‘g‘ri")
+        for i in range(4):
+            exam = self.exams[i % 2]
+            attempt = Attempt.objects.create(candidate=make_candidate(i), exam=exam, started_at=timezone.now())
+            for q in exam.questions.all()[:2]:
+                choice = q.choices.get(is_correct=i < 2)
+                Answer.objects.create(attempt=attempt, question=q, choice=choice, is_correct=choice.is_correct)
+
+    def test_query_count_does_not_grow_with_attempts(self):
+        with self.assertNumQueries(4):
+            wb = attempts_workbook(Attempt.objects.all())
+        wb.save(io.BytesIO())
+
+    def test_matrix_and_colours(self):
+        response = attempts_xlsx(Attempt.objects.all())
+        ws = openpyxl.load_workbook(io.BytesIO(b"".join(response.streaming_content))).active
+        rows = list(ws.iter_rows(min_row=1, values_only=True))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(len(rows[0]), 9 + 6)
+        self.assertEqual(rows[1][9:], ("To‘g‘ri", "To‘g‘ri", None, None, None, None))
+        self.assertEqual(ws.cell(row=2, column=10).fill.start_color.rgb, "00C6EFCE")
+        self.assertEqual(ws.cell(row=4, column=10).fill.start_color.rgb, "00FFC7CE")
+        self.assertEqual(ws.cell(row=2, column=8).number_format, "DD.MM.YYYY HH:MM")
+
+    def test_one_sheet_per_exam(self):
+        wb = attempts_workbook(Attempt.objects.all(), per_exam=True)
+        wb.save(io.BytesIO())
+        self.assertEqual([ws.title for ws in wb.worksheets], [f"{e.pk}. {e.title}" for e in self.exams])
+
+
+class ChangelistQueryTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        self.exam = Exam.objects.create(title="Imtihon")
+        self.question = Question.objects.create(exam=self.exam, text="Savol")
+        self.choice = Choice.objects.create(question=self.question, text="Ha", is_correct=True)
+        self.n = 0
+
+    def add_attempts(self, count):
+        for _ in range(count):
+            attempt = Attempt.objects.create(candidate=make_candidate(self.n), exam=self.exam)
+            Answer.objects.create(attempt=attempt, question=self.question, choice=self.choice)
+            self.n += 1
+
+    def assertConstantQueries(self, url, budget):
+        self.add_attempts(2)
+        with self.assertNumQueries(budget):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.add_attempts(20)
+        with self.assertNumQueries(budget):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_attempt_changelist(self):
+        self.assertConstantQueries("/admin/exam/attempt/", 6)
+
+    def test_answer_changelist(self):
+        self.assertConstantQueries("/admin/exam/answer/", 5)
+
+    def test_answer_change_form_does_not_list_every_attempt(self):
+        self.add_attempts(2)
+        answer = Answer.objects.first()
+        url = f"/admin/exam/answer/{answer.pk}/change/"
+        self.client.get(url)  # warms the content type cache
+        with self.assertNumQueries(10):
+            self.client.get(url)
+        self.add_attempts(20)
+        with self.assertNumQueries(10):
+            response = self.client.get(url)
+        self.assertContains(response, "admin-autocomplete")
+
+
+class QueryPlanTests(QueryPlanTestCase):
+    def test_candidate_by_phone(self):
+        self.assertUsesIndex(Candidate.objects.filter(phone="+998901234567"))
+
+    def test_candidate_by_normalized_phone(self):
+        self.assertUsesIndex(Candidate.objects.filter(phone_normalized="+998901234567"))
+
+    def test_open_attempts(self):
+        self.assertUsesIndex(Attempt.objects.filter(submitted_at__isnull=True, started_at__lt=timezone.now()))
+
+    def test_expired_attempts(self):
+        Exam.objects.create(title="Qisqa", duration_minutes=10)
+        Exam.objects.create(title="Uzun", duration_minutes=60)
+        self.assertUsesIndex(grading.expired_attempts())
+
+    def test_attempts_by_submitted_at(self):
+        self.assertUsesIndex(Attempt.objects.filter(submitted_at__gte=timezone.now()))
+
+    def test_attempt_by_token(self):
+        self.assertUsesIndex(Attempt.objects.filter(token="9b2e3f0c-6d2a-4c55-9b7e-1f6d2c4b8a11"))
+
+    def test_answers_by_question(self):
+        self.assertUsesIndex(Answer.objects.filter(question_id=1))
+
+
+class PhoneTests(TestCase):
+    def test_formats_share_one_key(self):
+        for raw in ("+998 90 123-45-67", "998901234567", "00998901234567", "90 123 45 67", "8 (90) 123-45-67"):
+            self.assertEqual(normalize_phone(raw), "+998901234567", raw)
+        self.assertIsNone(normalize_phone("12-34"))
+
+    def test_registration_reuses_candidate_for_any_format(self):
+        exam = Exam.objects.create(title="Imtihon")
+        data = {"full_name": "Ali Valiyev", "region": "Toshkent", "work_position": "Kassir", "hr_manager": "Boshqa"}
+        for phone in ("+998 90 123-45-67", "998901234567"):
+            response = self.client.post(f"/exam/{exam.pk}/register/", {**data, "phone": phone})
+            self.assertEqual(response.status_code, 302)
+        self.assertEqual(Candidate.objects.count(), 1)
+        self.assertEqual(Attempt.objects.count(), 1)
+
+    def test_invalid_phone_is_rejected(self):
+        exam = Exam.objects.create(title="Imtihon")
+        response = self.client.post(f"/exam/{exam.pk}/register/", {
+            "full_name": "Ali", "phone": "123", "region": "Toshkent", "work_position": "Kassir", "hr_manager": "Boshqa",
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Candidate.objects.exists())
+
+
+    def test_admin_rejects_a_known_number_in_another_format(self):
+        make_candidate(1)
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        response = self.client.post("/admin/exam/candidate/add/", {
+            "full_name": "Ali", "phone": "90 000 00 01", "region": "Toshkent",
+            "work_position": "Kassir", "hr_manager": "Boshqa",
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "allaqachon bor")
+        self.assertEqual(Candidate.objects.count(), 1)
+
+    def test_backfilled_duplicate_stays_editable(self):
+        holder = make_candidate(1)
+        duplicate = make_candidate(2)
+        Candidate.objects.filter(pk=duplicate.pk).update(phone=holder.phone, phone_normalized=None)
+        duplicate.refresh_from_db()
+        duplicate.full_name = "Yangi ism"
+        duplicate.save()
+        duplicate.refresh_from_db()
+        self.assertIsNone(duplicate.phone_normalized)
+
+    def test_new_candidate_with_a_taken_number_hits_the_unique_index(self):
+        make_candidate(1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Candidate.objects.create(
+                full_name="Ali", phone="90 000 00 01", region="Toshkent", work_position="Kassir", hr_manager="Boshqa",
+            )
+        self.assertEqual(Candidate.objects.count(), 1)
+
+
+class GradingTests(TestCase):
+    def setUp(self):
+        self.exam = Exam.objects.create(title="Imtihon", shuffle_questions=False)
+        self.mcq = Question.objects.create(exam=self.exam, text="MCQ", order=0)
+        self.right = Choice.objects.create(question=self.mcq, text="Ha", is_correct=True)
+        self.wrong = Choice.objects.create(question=self.mcq, text="Yo‘q")
+        self.short = Question.objects.create(exam=self.exam, text="Qisqa", qtype=Question.SHORT, order=1)
+        other = Question.objects.create(exam=Exam.objects.create(title="Boshqa"), text="?")
+        self.foreign = Choice.objects.create(question=other, text="Begona", is_correct=True)
+        self.attempt = Attempt.objects.create(
+            candidate=make_candidate(1), exam=self.exam, started_at=timezone.now(),
+            question_order=[self.mcq.pk, self.short.pk], total_questions=2,
+        )
+
+    def submit(self, data):
+        return self.client.post(f"/exam/{self.attempt.token}/submit/", data)
+
+    def test_submit_grades_in_constant_queries(self):
+        self.exam.refresh_from_db()
+        answer_keys.get(self.exam)
+        # Answer key cached: attempt, exam, then claim, upsert, read back and score in
+        # one transaction; no question or choice reads
+        with self.assertNumQueries(8):
+            self.submit({f"q-{self.mcq.pk}": self.right.pk, f"q-{self.short.pk}": " javob ", "focus_violations": 2})
+        self.attempt.refresh_from_db()
+        self.assertEqual((self.attempt.score, self.attempt.focus_violations), (1, 2))
+        answers = {a.question_id: a for a in self.attempt.answers.all()}
+        self.assertEqual(answers[self.mcq.pk].choice_id, self.right.pk)
+        self.assertEqual(answers[self.short.pk].text_answer, "javob")
+
+    def test_unanswered_questions_are_stored_blank(self):
+        self.submit({f"q-{self.mcq.pk}": self.right.pk})
+        blank = self.attempt.answers.get(question=self.short)
+        self.assertEqual((blank.choice_id, blank.text_answer, blank.is_correct), (None, "", False))
+
+    def test_choice_of_another_question_is_not_accepted(self):
+        self.submit({f"q-{self.mcq.pk}": self.foreign.pk})
+        answer = self.attempt.answers.get(question=self.mcq)
+        self.assertEqual((answer.choice_id, answer.is_correct), (None, False))
+
+    def test_second_submit_changes_nothing(self):
+        self.submit({f"q-{self.mcq.pk}": self.wrong.pk})
+        self.submit({f"q-{self.mcq.pk}": self.right.pk})
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.score, 0)
+        self.assertEqual(self.attempt.answers.get(question=self.mcq).choice_id, self.wrong.pk)
+
+    def autosave(self, data, **kwargs):
+        return self.client.post(f"/exam/{self.attempt.token}/autosave/", data, **kwargs)
+
+    def test_autosaved_answers_are_graded_on_submit(self):
+        self.assertEqual(self.autosave({f"q-{self.mcq.pk}": self.wrong.pk}).json(), {"saved": 1})
+        resp = self.autosave(
+            {f"q-{self.mcq.pk}": str(self.right.pk), f"q-{self.short.pk}": "javob"},
+            content_type="application/json",
+        )
+        self.assertEqual(resp.json(), {"saved": 2})
+        self.assertEqual(self.attempt.answers.get(question=self.mcq).choice_id, self.right.pk)
+
+        # The final post carries nothing new; the stored answers are graded
+        self.submit({})
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.score, 1)
+        self.assertEqual(self.attempt.answers.count(), 2)
+
+    def test_json_autosave_takes_numbers_and_rejects_nested_values(self):
+        resp = self.autosave({f"q-{self.mcq.pk}": self.right.pk}, content_type="application/json")
+        self.assertEqual(resp.json(), {"saved": 1})
+        self.assertEqual(self.attempt.answers.get(question=self.mcq).choice_id, self.right.pk)
+        resp = self.autosave({f"q-{self.mcq.pk}": [self.wrong.pk]}, content_type="application/json")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_blank_field_on_final_post_keeps_autosaved_answer(self):
+        self.autosave({f"q-{self.short.pk}": "uzun javob", f"q-{self.mcq.pk}": self.right.pk})
+        page = self.client.get(f"/exam/{self.attempt.token}/")
+        self.assertContains(page, "uzun javob")
+
+        # The timer submits the refreshed, still blank form
+        self.submit({f"q-{self.short.pk}": ""})
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.answers.get(question=self.short).text_answer, "uzun javob")
+        self.assertEqual(self.attempt.score, 1)
+
+    def test_autosave_is_refused_once_submitted_or_expired(self):
+        self.submit({})
+        self.assertEqual(self.autosave({f"q-{self.mcq.pk}": self.right.pk}).status_code, 409)
+        # Only the blank rows written on submit
+        self.assertFalse(self.attempt.answers.exclude(choice=None, text_answer="").exists())
+
+        late = Attempt.objects.create(
+            candidate=make_candidate(2), exam=self.exam, question_order=[self.mcq.pk],
+            started_at=timezone.now() - timezone.timedelta(minutes=self.exam.duration_minutes + 5),
+        )
+        resp = self.client.post(f"/exam/{late.token}/autosave/", {f"q-{self.mcq.pk}": self.right.pk})
+        self.assertEqual(resp.status_code, 403)
+
+    def test_changing_a_choice_invalidates_the_key(self):
+        version = Exam.objects.get(pk=self.exam.pk).version
+        self.submit({f"q-{self.mcq.pk}": self.wrong.pk})
+        self.wrong.is_correct = True
+        self.wrong.save()
+        self.exam.refresh_from_db()
+        self.assertEqual(self.exam.version, version + 1)
+        self.assertIn(self.wrong.pk, answer_keys.get(self.exam)[self.mcq.pk].correct)
+
+        self.assertEqual(grading.regrade(self.exam), 1)
+        self.attempt.refresh_from_db()
+        self.assertEqual(self.attempt.score, 1)
+
+
+class QuestionFragmentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.exam = Exam.objects.create(title="Imtihon")
+        self.first = Question.objects.create(exam=self.exam, text="Birinchi savol", order=0)
+        Choice.objects.create(question=self.first, text="Ha", is_correct=True)
+        self.second = Question.objects.create(exam=self.exam, text="Ikkinchi savol", qtype=Question.SHORT, order=1)
+        self.attempt = Attempt.objects.create(
+            candidate=make_candidate(1), exam=self.exam, started_at=timezone.now(),
+            question_order=[self.second.pk, self.first.pk], total_questions=2,
+        )
+
+    def get(self):
+        return self.client.get(f"/exam/{self.attempt.token}/").content.decode()
+
+    def test_warm_page_reads_no_questions(self):
+        self.get()
+        before = fragments.stats.as_dict()
+        # Attempt, exam and its saved answers; the questions come from one cache read
+        with self.assertNumQueries(3):
+            html = self.get()
+        after = fragments.stats.as_dict()
+        self.assertEqual((after["hits"] - before["hits"], after["misses"] - before["misses"]), (1, 0))
+        self.assertLess(html.index("Ikkinchi savol"), html.index("Birinchi savol"))
+
+    def test_editing_a_question_renders_fresh_fragments(self):
+        self.get()
+        self.first.text = "Yangilangan savol"
+        self.first.save()
+        self.assertIn("Yangilangan savol", self.get())
+
+    def test_saving_a_stale_exam_keeps_the_bumped_version(self):
+        stale = Exam.objects.get(pk=self.exam.pk)
+        self.get()
+        self.first.text = "Yangilangan savol"
+        self.first.save()
+
+        stale.title = "Yangi nom"
+        stale.save()
+        self.exam.refresh_from_db()
+        self.assertEqual(self.exam.title, "Yangi nom")
+        self.assertGreater(self.exam.version, stale.version)
+        self.assertIn("Yangilangan savol", self.get())
+
+
+class FinalizeExpiredTests(TestCase):
+    def setUp(self):
+        self.exam = Exam.objects.create(title="Imtihon", duration_minutes=30)
+        self.question = Question.objects.create(exam=self.exam, text="Savol")
+        self.right = Choice.objects.create(question=self.question, text="Ha", is_correct=True)
+
+    def attempt(self, i, minutes_ago, answer=None):
+        attempt = Attempt.objects.create(
+            candidate=make_candidate(i), exam=self.exam, question_order=[self.question.pk], total_questions=1,
+            started_at=timezone.now() - timezone.timedelta(minutes=minutes_ago),
+        )
+        if answer is not None:
+            Answer.objects.create(attempt=attempt, question=self.question, choice=answer, is_correct=True)
+        return attempt
+
+    def test_expired_attempts_are_graded_from_stored_answers(self):
+        answered = self.attempt(1, 45, answer=self.right)
+        blank = self.attempt(2, 45)
+        running = self.attempt(3, 5)
+        self.assertEqual(set(grading.expired_attempts()), {answered, blank})
+
+        call_command("finalize_expired_attempts", "--once", "--batch-size=1", stdout=io.StringIO())
+        for attempt in (answered, blank, running):
+            attempt.refresh_from_db()
+        self.assertEqual((answered.score, blank.score), (1, 0))
+        self.assertEqual(blank.answers.get().choice_id, None)
+        self.assertEqual(answered.answers.get().choice_id, self.right.pk)
+        self.assertIsNotNone(answered.submitted_at)
+        self.assertIsNotNone(blank.submitted_at)
+        self.assertIsNone(running.submitted_at)
+
+    def test_already_submitted_attempts_are_skipped(self):
+        attempt = self.attempt(1, 45, answer=self.right)
+        ids = [attempt.pk]
+        Attempt.objects.filter(pk=attempt.pk).update(submitted_at=timezone.now(), score=0)
+        self.assertEqual(grading.finalize(ids), 0)
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.score, 0)
+
+    def test_manual_submit_racing_the_finalizer_keeps_its_score(self):
+        raced = self.attempt(1, 45, answer=self.right)
+        expired = self.attempt(2, 45, answer=self.right)
+        manual_submit = timezone.now()
+        real_filter = Attempt.objects.filter
+
+        def filter_then_submit(*args, **kwargs):
+            queryset = real_filter(*args, **kwargs)
+            if "pk__in" not in kwargs:
+                return queryset
+
+            def values_list(*fields):
+                rows = list(queryset.values_list(*fields))
+                # The candidate submits between the finalizer's read and its claim
+                real_filter(pk=raced.pk).update(submitted_at=manual_submit, score=7)
+                return rows
+
+            return mock.Mock(values_list=values_list)
 
-# Create your tests here.
+        with mock.patch.object(Attempt.objects, "filter", side_effect=filter_then_submit):
+            self.assertEqual(grading.finalize([raced.pk, expired.pk]), 1)
+        raced.refresh_from_db()
+        expired.refresh_from_db()
+        self.assertEqual((raced.submitted_at, raced.score), (manual_submit, 7))
+        self.assertEqual(expired.score, 1)
@@ -4,6 +4,8 @@ from . import views
 urlpatterns = [
     path("<int:exam_id>/register/", views.register_for_exam, name="register_exam"),
     path("<uuid:token>/", views.exam_view, name="exam_view"),
+    path("<uuid:token>/autosave/", views.exam_autosave, name="exam_autosave"),
     path("<uuid:token>/submit/", views.exam_submit, name="exam_submit"),
     path("<uuid:token>/result/", views.exam_result, name="exam_result"),
+    path("fragments/stats/", views.fragment_stats, name="exam_fragment_stats"),
 ]
@@ -1,11 +1,16 @@
+import json
 import random
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponseForbidden
+from django.http import HttpResponseForbidden, JsonResponse
 from django.utils import timezone
-from .models import Attempt, Candidate, Exam, Question, Choice, Answer
+from django.views.decorators.http import require_POST
+from .models import Attempt, Candidate, Exam
 
 from django.conf import settings
+from conf.decorators import staff_required
+from . import fragments, grading
 from .forms import CandidateRegistrationForm
+from .phones import normalize_phone
 
 from django.shortcuts import redirect
 
@@ -15,8 +20,10 @@ def register_for_exam(request, exam_id):
     if request.method == "POST":
         form = CandidateRegistrationForm(request.POST)
         if form.is_valid():
+            # The unique index on phone_normalized makes this safe against
+            # two simultaneous registrations: the loser re-reads the winner's row
             candidate, _ = Candidate.objects.get_or_create(
-                phone=form.cleaned_data.get("phone"),   # phone instead of email
+                phone_normalized=normalize_phone(form.cleaned_data["phone"]),
                 defaults=form.cleaned_data,
             )
 
@@ -51,18 +58,16 @@ def exam_view(request, token):
             random.shuffle(qs)
         attempt.question_order = [q.id for q in qs]
         attempt.total_questions = len(qs)
-        attempt.save()
+        attempt.save(update_fields=["started_at", "question_order", "total_questions"])
 
     if attempt.ends_at and timezone.now() > attempt.ends_at:
         return redirect("exam_submit", token=token)
 
-    qs_map = {q.id: q for q in exam.questions.prefetch_related("choices")}
-    questions = [qs_map[qid] for qid in attempt.question_order if qid in qs_map]
-
     return render(request, "exams/exam_page.html", {
         "exam": exam,
         "attempt": attempt,
-        "questions": questions,
+        "questions_html": fragments.render_questions(exam, attempt.question_order),
+        "saved_answers": grading.saved_values(attempt),
     })
 
 
@@ -78,37 +83,36 @@ def exam_submit(request, token):
         else:
             return HttpResponseForbidden("Invalid submission method.")
 
-    attempt.answers.all().delete()
-
-    correct_count = 0
-    for qid in attempt.question_order:
-        q = Question.objects.get(pk=qid)
-        key = f"q-{q.id}"
-        val = request.POST.get(key, "").strip()
+    grading.submit(attempt, request.POST, focus_violations=int(request.POST.get("focus_violations", 0)))
 
-        ans = Answer(attempt=attempt, question=q)
+    return redirect("exam_result", token=token)
 
-        if q.qtype in ["MCQ", "TF"]:
-            try:
-                choice = Choice.objects.get(pk=val, question=q)
-                ans.choice = choice
-                ans.is_correct = choice.is_correct
-            except (Choice.DoesNotExist, ValueError):
-                ans.is_correct = False
-        elif q.qtype == "SHORT":
-            ans.text_answer = val
-            ans.is_correct = False
 
-        ans.save()
-        if ans.is_correct:
-            correct_count += 1
+@require_POST
+def exam_autosave(request, token):
+    attempt = get_object_or_404(Attempt.objects.select_related("exam"), token=token)
 
-    attempt.score = correct_count
-    attempt.submitted_at = timezone.now()
-    attempt.focus_violations = int(request.POST.get("focus_violations", 0))
-    attempt.save()
+    if attempt.submitted_at:
+        return JsonResponse({"error": "Imtihon yakunlangan"}, status=409)
+    if not attempt.ends_at or timezone.now() > attempt.ends_at + timezone.timedelta(seconds=settings.EXAM_AUTOSAVE_GRACE):
+        return JsonResponse({"error": "Vaqt tugagan"}, status=403)
+
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict) or not all(
+            v is None or isinstance(v, (str, int, float)) for v in data.values()
+        ):
+            return JsonResponse({"error": "Noto‘g‘ri so‘rov"}, status=400)
+    else:
+        data = request.POST
 
-    return redirect("exam_result", token=token)
+    saved = grading.autosave(attempt, data)
+    if saved is None:
+        return JsonResponse({"error": "Imtihon yakunlangan"}, status=409)
+    return JsonResponse({"saved": saved})
 
 
 def exam_result(request, token):
@@ -122,3 +126,8 @@ def exam_result(request, token):
         "score": attempt.score,
         "total": attempt.total_questions,
     })
+
+
+@staff_required
+def fragment_stats(request):
+    return JsonResponse(fragments.stats.as_dict())
@@ -0,0 +1,25 @@
+from django.contrib import messages
+from django.urls import reverse
+from django.utils.html import format_html
+
+from .jobs import request_report
+from .kinds import KINDS
+
+
+def background_export(kind):
+    """Admin action that queues `kind` for run_reports instead of building it in the request."""
+
+    def action(modeladmin, request, queryset):
+        job, reused = request_report(kind, queryset, request.user)
+        url = reverse("admin:reports_reportjob_change", args=[job.pk])
+        if reused and job.status == job.DONE:
+            text = "Hisobot tayyor, ma’lumotlar o‘zgarmagan: {}"
+        else:
+            text = "Hisobot navbatga qo‘yildi: {}"
+        modeladmin.message_user(
+            request, format_html(text, format_html('<a href="{}">#{}</a>', url, job.pk)), messages.SUCCESS
+        )
+
+    action.__name__ = f"export_{kind}_in_background"
+    action.short_description = f"{KINDS[kind].label} — fonda tayyorlash"
+    return action
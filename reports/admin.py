@@ -0,0 +1,45 @@
+from django.contrib import admin
+from django.urls import reverse
+from django.utils.html import format_html
+
+from .kinds import KINDS
+from .models import ReportJob
+
+
+# -----------------------
+# ReportJob
+# -----------------------
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind_label", "status", "progress_display", "requested_by", "created_at", "download_link")
+    list_filter = ("status", "kind")
+    readonly_fields = (
+        "kind", "status", "progress_display", "data_stamp", "requested_by",
+        "created_at", "finished_at", "download_link", "error",
+    )
+    exclude = ("query", "fingerprint", "file", "progress", "total")
+
+    def has_add_permission(self, request):
+        return False
+
+    def kind_label(self, obj):
+        return KINDS[obj.kind].label if obj.kind in KINDS else obj.kind
+
+    kind_label.short_description = "Turi"
+
+    def progress_display(self, obj):
+        if obj.status == ReportJob.DONE:
+            return f"{obj.total} / {obj.total}"
+        if not obj.total:
+            return "-"
+        return f"{obj.progress} / {obj.total} ({obj.progress * 100 // obj.total}%)"
+
+    progress_display.short_description = "Jarayon"
+
+    def download_link(self, obj):
+        if obj.status != ReportJob.DONE or not obj.file:
+            return "-"
+        url = reverse("report_download", args=[obj.pk])
+        return format_html('<a href="{}">Yuklab olish</a>', url)
+
+    download_link.short_description = "Fayl"
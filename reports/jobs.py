@@ -0,0 +1,114 @@
+import hashlib
+import logging
+import pickle
+import tempfile
+import traceback
+from datetime import timedelta
+
+from django.core.files import File
+from django.utils import timezone
+
+from .kinds import KINDS
+from .models import ReportJob
+
+logger = logging.getLogger(__name__)
+
+# A RUNNING job whose progress has not moved for this long lost its worker
+STALE_AFTER = timedelta(minutes=10)
+
+
+def fingerprint(kind, queryset):
+    sql, params = queryset.order_by().query.sql_with_params()
+    return hashlib.sha256(repr((kind, sql, params)).encode()).hexdigest()
+
+
+def request_report(kind, queryset, user=None):
+    """
+    Return (job, reused) for exporting queryset as `kind`.
+
+    A finished report with the same filter is reused as long as the data
+    stamp still matches; a queued or running one is joined instead of
+    starting a second copy.
+    """
+    spec = KINDS[kind]
+    fp = fingerprint(kind, queryset)
+
+    previous = (
+        ReportJob.objects.filter(
+            fingerprint=fp, status__in=[ReportJob.PENDING, ReportJob.RUNNING, ReportJob.DONE]
+        )
+        .order_by("-pk")
+        .first()
+    )
+    if previous is not None:
+        if previous.status != ReportJob.DONE or previous.data_stamp == spec.stamp(queryset):
+            return previous, True
+
+    job = ReportJob.objects.create(
+        kind=kind,
+        query=pickle.dumps(queryset.query),
+        fingerprint=fp,
+        requested_by=user if user is not None and user.is_authenticated else None,
+    )
+    return job, False
+
+
+def load_queryset(job):
+    queryset = KINDS[job.kind].model.objects.all()
+    queryset.query = pickle.loads(job.query)
+    return queryset
+
+
+def claim_next():
+    """Mark the oldest pending job as running; None when the queue is empty."""
+    for pk in ReportJob.objects.filter(status=ReportJob.PENDING).order_by("pk").values_list("pk", flat=True)[:10]:
+        if ReportJob.objects.filter(pk=pk, status=ReportJob.PENDING).update(
+            # updated_at doubles as the heartbeat release_stale() checks
+            status=ReportJob.RUNNING, updated_at=timezone.now()
+        ):
+            return pk
+    return None
+
+
+def release_stale():
+    return ReportJob.objects.filter(
+        status=ReportJob.RUNNING, updated_at__lt=timezone.now() - STALE_AFTER
+    ).update(status=ReportJob.PENDING, progress=0, updated_at=timezone.now())
+
+
+def mark_failed(pk, error):
+    ReportJob.objects.filter(pk=pk).update(
+        status=ReportJob.FAILED, error=error[-4000:], finished_at=timezone.now(), updated_at=timezone.now()
+    )
+
+
+def generate(pk):
+    """Build a claimed job's file under MEDIA_ROOT/reports/; runs in a worker process."""
+    job = ReportJob.objects.get(pk=pk)
+    spec = KINDS[job.kind]
+    try:
+        queryset = load_queryset(job)
+        # Stamp before reading: a change made while we export gives a new stamp
+        stamp = spec.stamp(queryset)
+        total = queryset.count()
+        ReportJob.objects.filter(pk=pk).update(
+            total=total, progress=0, data_stamp=stamp, updated_at=timezone.now()
+        )
+
+        def progress(done):
+            ReportJob.objects.filter(pk=pk).update(progress=done, updated_at=timezone.now())
+
+        with tempfile.TemporaryFile() as tmp:
+            spec.write(queryset, tmp, progress=progress)
+            tmp.seek(0)
+            job.file.save(f"{pk}-{spec.filename}", File(tmp), save=False)
+    except Exception:
+        logger.exception("Report %s failed", pk)
+        mark_failed(pk, traceback.format_exc())
+        return False
+
+    ReportJob.objects.filter(pk=pk).update(
+        status=ReportJob.DONE, file=job.file.name, progress=total, finished_at=timezone.now(),
+        updated_at=timezone.now(),
+    )
+    return True
@@ -0,0 +1,69 @@
+from django.db.models import Count, Max, Sum
+
+from bot.exports import write_applications_csv, write_applications_xlsx
+from bot.models import JobApplication
+from exam.exports import attempts_workbook
+from exam.models import Answer, Attempt
+
+
+def _stamp(*aggregates):
+    return "|".join(",".join(f"{k}={agg[k]}" for k in sorted(agg)) for agg in aggregates)
+
+
+def application_stamp(queryset):
+    # Exported rows also show the user, position and location names
+    return _stamp(queryset.order_by().aggregate(
+        n=Count("pk"), last=Max("pk"), changed=Max("updated_at"), users=Max("user__updated_at"),
+        positions=Max("position__updated_at"), locations=Max("location__updated_at"),
+    ))
+
+
+def attempt_stamp(queryset):
+    queryset = queryset.order_by()
+    return _stamp(
+        # Scores are rewritten with update() (submit, regrade, the sweeper), so
+        # they are summed; question or choice edits bump the exam version
+        queryset.aggregate(
+            n=Count("pk"), last=Max("pk"), started=Max("started_at"), submitted=Max("submitted_at"),
+            score=Sum("score"), candidates=Max("candidate__updated_at"), exams=Max("exam__updated_at"),
+            versions=Sum("exam__version"),
+        ),
+        Answer.objects.filter(attempt__in=queryset.values("pk")).aggregate(
+            n=Count("pk"), last=Max("pk"), answered=Max("answered_at")
+        ),
+    )
+
+
+def write_attempts(per_exam):
+    def write(queryset, fileobj, progress=None):
+        attempts_workbook(queryset, per_exam=per_exam, progress=progress).save(fileobj)
+    return write
+
+
+class Kind:
+    def __init__(self, model, write, stamp, filename, label):
+        self.model = model
+        self.write = write
+        self.stamp = stamp
+        self.filename = filename
+        self.label = label
+
+
+KINDS = {
+    "applications_xlsx": Kind(
+        JobApplication, write_applications_xlsx, application_stamp, "job_applications.xlsx",
+        "Arizalar (Excel)",
+    ),
+    "applications_csv": Kind(
+        JobApplication, write_applications_csv, application_stamp, "job_applications.csv",
+        "Arizalar (CSV)",
+    ),
+    "attempts_xlsx": Kind(
+        Attempt, write_attempts(per_exam=False), attempt_stamp, "urinishlar.xlsx",
+        "Urinishlar (Excel)",
+    ),
+    "attempts_by_exam_xlsx": Kind(
+        Attempt, write_attempts(per_exam=True), attempt_stamp, "urinishlar.xlsx",
+        "Urinishlar, imtihonlar bo‘yicha (Excel)",
+    ),
+}
@@ -0,0 +1,62 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from reports import jobs
+
+
+def _init_worker():
+    import django
+    django.setup()
+    # Never share the parent's database connections across a fork
+    connections.close_all()
+
+
+def _generate(pk):
+    try:
+        return jobs.generate(pk)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Generate queued admin reports in a local process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+        parser.add_argument("--idle-sleep", type=float, default=2.0)
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            running = {}
+            while True:
+                jobs.release_stale()
+                while len(running) < workers and (pk := jobs.claim_next()) is not None:
+                    running[pool.submit(_generate, pk)] = pk
+                    self.stdout.write(f"Report {pk} started")
+
+                if not running:
+                    if options["once"]:
+                        return
+                    time.sleep(options["idle_sleep"])
+                    continue
+
+                done, _ = wait(running, timeout=options["idle_sleep"], return_when=FIRST_COMPLETED)
+                for future in done:
+                    pk = running.pop(future)
+                    try:
+                        ok = future.result()
+                    except Exception as e:
+                        # The worker process died (e.g. out of memory); retrying would too
+                        jobs.mark_failed(pk, f"Worker crashed: {e!r}")
+                        self.stderr.write(f"Report {pk} crashed: {e!r}")
+                        if isinstance(e, BrokenProcessPool):
+                            raise
+                        continue
+                    self.stdout.write(f"Report {pk} {'done' if ok else 'failed'}")
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50, verbose_name='Turi')),
+                ('query', models.BinaryField()),
+                ('fingerprint', models.CharField(db_index=True, max_length=64)),
+                ('data_stamp', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Navbatda'), ('running', 'Tayyorlanmoqda'), ('done', 'Tayyor'), ('failed', 'Xato')], default='pending', max_length=10, verbose_name='Holati')),
+                ('progress', models.PositiveIntegerField(default=0, verbose_name='Tayyor qatorlar')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Jami qatorlar')),
+                ('file', models.FileField(blank=True, upload_to='reports/', verbose_name='Fayl')),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Yaratilgan vaqt')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Tugagan vaqt')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Hisobot',
+                'verbose_name_plural': 'Hisobotlar',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='reports_rep_status_051565_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.db import models
+
+
+class ReportJob(models.Model):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    STATUSES = [
+        (PENDING, "Navbatda"),
+        (RUNNING, "Tayyorlanmoqda"),
+        (DONE, "Tayyor"),
+        (FAILED, "Xato"),
+    ]
+
+    kind = models.CharField("Turi", max_length=50)
+    # Pickled django.db.models.sql.Query of the exported queryset
+    query = models.BinaryField()
+    # Hash of kind + SQL; identical filters share a fingerprint
+    fingerprint = models.CharField(max_length=64, db_index=True)
+    # Snapshot of the exported rows (count, last id, last change) at generation time
+    data_stamp = models.CharField(max_length=255, blank=True)
+
+    status = models.CharField("Holati", max_length=10, choices=STATUSES, default=PENDING)
+    progress = models.PositiveIntegerField("Tayyor qatorlar", default=0)
+    total = models.PositiveIntegerField("Jami qatorlar", default=0)
+    file = models.FileField("Fayl", upload_to="reports/", blank=True)
+    error = models.TextField(blank=True)
+
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL
+    )
+    created_at = models.DateTimeField("Yaratilgan vaqt", auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField("Tugagan vaqt", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Hisobot"
+        verbose_name_plural = "Hisobotlar"
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk}"
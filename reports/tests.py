@@ -0,0 +1,84 @@
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from bot.models import JobApplication, TgUser
+from exam.models import Attempt, Candidate, Exam
+
+from . import jobs, kinds
+from .models import ReportJob
+
+
+class ReportJobTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        for i in range(3):
+            user = TgUser.objects.create(telegram_id=i, first_name=f"User{i}")
+            JobApplication.objects.create(
+                user=user, birth_date="2000-01-01", region="Toshkent", phone_number="+998901234567",
+            )
+
+    def run_job(self, queryset, kind="applications_csv"):
+        job, reused = jobs.request_report(kind, queryset)
+        if not reused:
+            self.assertEqual(jobs.claim_next(), job.pk)
+            self.assertTrue(jobs.generate(job.pk))
+        job.refresh_from_db()
+        return job, reused
+
+    def test_report_is_generated_with_progress(self):
+        job, reused = self.run_job(JobApplication.objects.filter(region="Toshkent"))
+        self.assertFalse(reused)
+        self.assertEqual((job.status, job.progress, job.total), (ReportJob.DONE, 3, 3))
+        with job.file.open("rb") as f:
+            self.assertEqual(len(f.read().decode("utf-8-sig").splitlines()), 4)
+
+    def test_same_filter_reuses_report_until_data_changes(self):
+        first, _ = self.run_job(JobApplication.objects.filter(region="Toshkent"))
+        again, reused = self.run_job(JobApplication.objects.filter(region="Toshkent"))
+        self.assertTrue(reused)
+        self.assertEqual(again.pk, first.pk)
+
+        app = JobApplication.objects.first()
+        app.status = "accepted"
+        app.save()
+        fresh, reused = self.run_job(JobApplication.objects.filter(region="Toshkent"))
+        self.assertFalse(reused)
+        self.assertNotEqual(fresh.pk, first.pk)
+
+    def test_pending_job_is_joined(self):
+        first, _ = jobs.request_report("applications_xlsx", JobApplication.objects.all())
+        second, reused = jobs.request_report("applications_xlsx", JobApplication.objects.all())
+        self.assertTrue(reused)
+        self.assertEqual(first.pk, second.pk)
+
+    def test_stamp_follows_joined_rows_and_rewritten_scores(self):
+        queryset = JobApplication.objects.all()
+        before = kinds.application_stamp(queryset)
+        user = TgUser.objects.get(telegram_id=0)
+        user.first_name = "Boshqa"
+        user.save()
+        self.assertNotEqual(kinds.application_stamp(queryset), before)
+
+        candidate = Candidate.objects.create(
+            full_name="Nomzod", phone="+998901234567", region="Toshkent", work_position="Kassir", hr_manager="Boshqa",
+        )
+        attempt = Attempt.objects.create(candidate=candidate, exam=Exam.objects.create(title="Imtihon"), score=1)
+        before = kinds.attempt_stamp(Attempt.objects.all())
+        # As regrade does it: no save(), no timestamps touched
+        Attempt.objects.filter(pk=attempt.pk).update(score=2)
+        self.assertNotEqual(kinds.attempt_stamp(Attempt.objects.all()), before)
+
+    def test_job_that_waited_in_the_queue_is_not_released_after_its_claim(self):
+        job, _ = jobs.request_report("applications_csv", JobApplication.objects.all())
+        ReportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - jobs.STALE_AFTER * 2)
+
+        self.assertEqual(jobs.claim_next(), job.pk)
+        self.assertEqual(jobs.release_stale(), 0)
+        self.assertIsNone(jobs.claim_next())
+        self.assertTrue(jobs.generate(job.pk))
+        self.assertEqual(ReportJob.objects.get(pk=job.pk).status, ReportJob.DONE)
@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path("<int:pk>/download/", views.download_report, name="report_download"),
+]
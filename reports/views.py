@@ -0,0 +1,14 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+
+from .kinds import KINDS
+from .models import ReportJob
+
+
+@staff_member_required
+def download_report(request, pk):
+    job = get_object_or_404(ReportJob, pk=pk, status=ReportJob.DONE)
+    if not job.file:
+        raise Http404
+    return FileResponse(job.file.open("rb"), as_attachment=True, filename=KINDS[job.kind].filename)